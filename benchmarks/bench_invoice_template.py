@@ -0,0 +1,76 @@
+"""Per-invoice CPU time with and without the cached InvoiceTemplate.
+
+    python -m benchmarks.bench_invoice_template [--invoices 200] [--items 10]
+
+"before" rebuilds the template for every invoice, which is what
+generate_invoice used to do inline; "after" reuses the generator's template.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from utils.invoice_generator import InvoiceGenerator, InvoiceTemplate
+
+
+def sample_invoice(number, item_count):
+    items = [{
+        'product_name': "RADIATOR COOLANT GREEN OVER-HEAT PREVENTIVE (1L)",
+        'units_per_coton': 12,
+        'quantity': 24,
+        'unit_rate': 530,
+        'discount_percent': 5,
+        'discount_amount': 26.5,
+        'net_rate': 503.5,
+        'total_price': 12084.0,
+    } for _ in range(item_count)]
+    return {
+        'invoice_number': number,
+        'customer_name': "Khyber Auto Store",
+        'customer_address': "Shop 12, University Road, Peshawar",
+        'order_booker_name': "Zubair Khan (0315-9288706)",
+        'date': "2026-01-15",
+        'items': items,
+        'total_amount': 12084.0 * item_count,
+    }
+
+
+def cpu_time(generator, invoice, output_path, rebuild_template):
+    start = time.process_time()
+    if rebuild_template:
+        generator.template = InvoiceTemplate(generator)
+    generator.generate_invoice(invoice, output_path)
+    return time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--items", type=int, default=10)
+    args = parser.parse_args()
+
+    generator = InvoiceGenerator()
+    invoices = [sample_invoice(1050 + i, args.items) for i in range(args.invoices)]
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "invoice.pdf")
+        for invoice in invoices[:10]:  # warm up fonts and caches
+            cpu_time(generator, invoice, output_path, False)
+        # Interleaved so that drift affects both variants equally
+        before, after = [], []
+        for invoice in invoices:
+            before.append(cpu_time(generator, invoice, output_path, True))
+            after.append(cpu_time(generator, invoice, output_path, False))
+
+    start = time.process_time()
+    for _ in range(args.invoices):
+        InvoiceTemplate(generator)
+    static_cost = (time.process_time() - start) / args.invoices
+
+    print(f"{args.invoices} invoices x {args.items} items")
+    print(f"static pieces per invoice:   {static_cost * 1000:.3f} ms")
+    for label, times in (("before (rebuilt per invoice)", before), ("after (cached template)", after)):
+        print(f"{label:29s} median {statistics.median(times) * 1000:.3f} ms, mean {statistics.mean(times) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Cold-start and first-interaction latency of the app.
+
+    python -m benchmarks.bench_startup [--runs 5]
+
+Every run is a fresh Python process (a cold start) driving main.py
+through Streamlit's AppTest against a throwaway SQLite store:
+
+  first render       first script run, up to the title with the next number
+  first interaction  setting a quantity (pricing the line items)
+  first submit       generating the first invoice (save and PDF render)
+
+"eager" builds the backend and the InvoiceGenerator and imports pandas
+before the first render, which is what importing main.py used to do;
+"lazy" is the current code. With Google Sheets the eager variant also
+pays for authorizing and opening the spreadsheet before anything renders;
+that network time is not included here.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "reportlab", "gspread"]
+
+
+def child(eager):
+    from streamlit.testing.v1 import AppTest
+
+    timings = {}
+    start = time.perf_counter()
+    if eager:
+        import pandas  # noqa: F401
+        from utils.backend import get_data_manager, get_invoice_generator
+
+        get_data_manager()
+        get_invoice_generator()
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=60).run()
+    timings["first render"] = time.perf_counter() - start
+    timings["loaded after render"] = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    next(t for t in at.text_input if t.label == "Customer Name").input("Khyber Auto Store")
+    at.text_area[0].input("University Road, Peshawar")
+    at.selectbox(key="product_name_0").select_index(2).run()
+    start = time.perf_counter()
+    at.number_input(key="quantity_0").set_value(12).run()
+    timings["first interaction"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    next(b for b in at.button if b.label == "Generate Invoice").click().run()
+    timings["first submit"] = time.perf_counter() - start
+    if at.exception:
+        raise SystemExit(f"app raised: {at.exception[0].value}")
+    print(json.dumps(timings))
+
+
+def run_once(eager, tmp):
+    run_id = time.time_ns()
+    # Everything the first submit writes stays in tmp, including its stock sale
+    env = dict(
+        os.environ,
+        INVOICE_STORAGE_BACKEND="sqlite",
+        SQLITE_PATH=os.path.join(tmp, f"invoices-{run_id}.db"),
+        INVENTORY_LEDGER_PATH=os.path.join(tmp, f"stock_ledger-{run_id}.jsonl"),
+    )
+    command = [sys.executable, "-m", "benchmarks.bench_startup", "--child"] + (["--eager"] if eager else [])
+    output = subprocess.run(command, cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.eager)
+
+    results = {"eager": [], "lazy": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Interleaved so that drift affects both variants equally
+        for _ in range(args.runs):
+            for variant in results:
+                results[variant].append(run_once(variant == "eager", tmp))
+
+    print(f"{args.runs} cold starts per variant (median seconds)")
+    for variant, runs in results.items():
+        medians = {
+            step: statistics.median(run[step] for run in runs)
+            for step in ("first render", "first interaction", "first submit")
+        }
+        loaded = ", ".join(runs[0]["loaded after render"]) or "none"
+        print(f"{variant:5s}  " + "  ".join(f"{step} {value:.3f}" for step, value in medians.items())
+              + f"  (heavy modules after render: {loaded})")
+
+
+if __name__ == "__main__":
+    main()
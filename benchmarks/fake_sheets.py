@@ -0,0 +1,151 @@
+"""In-memory stand-in for the parts of the gspread API the app uses.
+
+FakeSpreadsheet and FakeWorksheet behave like gspread's Spreadsheet and
+Worksheet for the calls GoogleSheetsDataManager makes (A1 ranges, trailing
+empty cells and rows trimmed, append_rows reporting the updated range),
+so the real data manager runs against them unchanged:
+
+    spreadsheet = FakeSpreadsheet(latency=0.05)
+    manager = GoogleSheetsDataManager("invoices", client=SheetsClient(...), spreadsheet=spreadsheet)
+
+Every call sleeps for `latency` seconds (plus up to `jitter`) to stand in
+for the network round trip, and is counted in `calls`.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+import gspread
+from gspread.utils import a1_range_to_grid_range
+from utils.storage import INVOICE_COLUMNS
+
+
+class FakeCell:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeWorksheet:
+    def __init__(self, title, rows=None, latency=0.0, jitter=0.0, worksheet_id=0, spreadsheet=None):
+        self.title = title
+        self.id = worksheet_id
+        self.spreadsheet = spreadsheet
+        self.rows = rows if rows is not None else []
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        self.calls[name] += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+    @staticmethod
+    def _trim(values):
+        while values and values[-1] in ("", None):
+            values.pop()
+        return values
+
+    def _range(self, a1):
+        grid = a1_range_to_grid_range(a1.split("!")[-1])
+        with self._lock:
+            row_count = len(self.rows)
+            first_row = grid.get("startRowIndex", 0)
+            last_row = min(grid.get("endRowIndex", row_count), row_count)
+            first_col = grid.get("startColumnIndex", 0)
+            last_col = grid.get("endColumnIndex")
+            values = [
+                self._trim([str(v) for v in row[first_col:last_col]])
+                for row in self.rows[first_row:last_row]
+            ]
+        return self._trim(values)
+
+    def get(self, range_name=None, **kwargs):
+        self._call("get")
+        return self._range(range_name)
+
+    def batch_get(self, ranges, **kwargs):
+        self._call("batch_get")
+        return [self._range(a1) for a1 in ranges]
+
+    def row_values(self, row, **kwargs):
+        self._call("row_values")
+        with self._lock:
+            values = self.rows[row - 1] if row <= len(self.rows) else []
+        return self._trim([str(v) for v in values])
+
+    def col_values(self, col, **kwargs):
+        self._call("col_values")
+        with self._lock:
+            return self._trim([str(row[col - 1]) if col <= len(row) else "" for row in self.rows])
+
+    def get_all_records(self, **kwargs):
+        self._call("get_all_records")
+        with self._lock:
+            headers, rows = self.rows[0], self.rows[1:]
+        return [dict(zip(headers, row)) for row in rows]
+
+    def append_rows(self, rows, **kwargs):
+        self._call("append_rows")
+        with self._lock:
+            first_row = len(self.rows) + 1
+            self.rows.extend(list(row) for row in rows)
+            last_row = len(self.rows)
+        return {"updates": {"updatedRange": f"{self.title}!A{first_row}:Z{last_row}", "updatedRows": len(rows)}}
+
+    def append_row(self, row, **kwargs):
+        return self.append_rows([row], **kwargs)
+
+    def acell(self, label, **kwargs):
+        self._call("acell")
+        values = self._range(label)
+        return FakeCell(values[0][0] if values and values[0] else None)
+
+    def update_acell(self, label, value):
+        self._call("update_acell")
+        grid = a1_range_to_grid_range(label)
+        row, col = grid["startRowIndex"], grid["startColumnIndex"]
+        with self._lock:
+            while len(self.rows) <= row:
+                self.rows.append([])
+            while len(self.rows[row]) <= col:
+                self.rows[row].append("")
+            self.rows[row][col] = value
+
+
+class FakeSpreadsheet:
+    def __init__(self, latency=0.0, jitter=0.0, spreadsheet_id="fake"):
+        self.id = spreadsheet_id
+        self.latency = latency
+        self.jitter = jitter
+        self.worksheets = {}
+
+    def add_worksheet(self, title, rows=1, cols=1, data=None, **kwargs):
+        worksheet = FakeWorksheet(title, data, self.latency, self.jitter, len(self.worksheets), self)
+        self.worksheets[title] = worksheet
+        return worksheet
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def calls(self):
+        total = Counter()
+        for worksheet in self.worksheets.values():
+            total.update(worksheet.calls)
+        return total
+
+
+def invoice_sheet(invoices, latency=0.0, jitter=0.0, worksheet_name="Sheet1"):
+    """A FakeSpreadsheet whose invoice worksheet already holds the given invoices"""
+    rows = [list(INVOICE_COLUMNS)]
+    for invoice in invoices:
+        invoice = dict(invoice, items=json.dumps(invoice["items"]))
+        rows.append([invoice.get(column, "") for column in INVOICE_COLUMNS])
+    spreadsheet = FakeSpreadsheet(latency, jitter)
+    spreadsheet.add_worksheet(worksheet_name, data=rows)
+    return spreadsheet
@@ -0,0 +1,323 @@
+"""Offline benchmark suite for storage, numbering, rendering and submit.
+
+    python -m benchmarks.run_benchmarks [--rows 1000,20000] [--latency-ms 0,50]
+        [--items 1,10,100] [--ops 50] [--out results.json]
+        [--baseline old.json --threshold 1.25]
+
+GoogleSheetsDataManager runs unchanged against the in-memory sheet from
+benchmarks/fake_sheets.py, prefilled with `rows` synthetic invoices and
+answering every API call after `latency` ms. Nothing touches the network
+or needs credentials. The suite measures:
+
+  lookup_cold     get_invoice_by_number on a fresh manager (builds the row index)
+  lookup_warm     get_invoice_by_number for random existing numbers
+  next_number     get_next_invoice_number (cached peek)
+  claim_number    claim_next_invoice_number
+  save            save_invoice straight to the sheet
+  render          InvoiceGenerator.generate_invoice_bytes, per line-item count
+  submit          claim + queued save + render through the app's stack, one at a time
+  submit_parallel the same with 8 concurrent submitters (throughput)
+  edit_full       a quantity edit on the invoice page, rerunning the whole
+                  script (every widget change did this before fragments)
+  edit_fragment   the same edit rerunning only the line-item fragment
+
+The edit benchmarks drive main.py with Streamlit's AppTest against the
+same fake sheet and also report Sheets requests per edit.
+
+Results are written as JSON: one record per (benchmark, rows, latency,
+items) with latency percentiles in ms and ops/s. With --baseline, p50s are
+compared to an earlier results file and the exit status is 1 if any got
+slower by more than --threshold.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from unittest import mock
+from benchmarks.fake_sheets import invoice_sheet
+from benchmarks.synthetic import InvoiceFactory
+from utils.cached_data_manager import CachedDataManager
+from utils.google_sheets_data_manager import GoogleSheetsDataManager
+from utils.invoice_generator import InvoiceGenerator
+from utils.invoice_write_queue import InvoiceWriteQueue
+from utils.sheets_client import SheetsClient
+from utils.submission_pipeline import SubmissionPipeline
+
+TEMPLATE_POOL = 500
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def summarize(name, samples, wall_seconds=None, **params):
+    samples = sorted(samples)
+    ops = len(samples)
+    wall_seconds = wall_seconds if wall_seconds is not None else sum(samples)
+    return {
+        "benchmark": name,
+        **params,
+        "ops": ops,
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(samples[ops // 2] * 1000, 3),
+        "p95_ms": round(samples[min(ops - 1, int(ops * 0.95))] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+        "ops_per_s": round(ops / wall_seconds, 2) if wall_seconds else None,
+    }
+
+
+def timed_calls(fn, arguments):
+    samples = []
+    start = time.perf_counter()
+    for argument in arguments:
+        call_start = time.perf_counter()
+        fn(argument)
+        samples.append(time.perf_counter() - call_start)
+    return samples, time.perf_counter() - start
+
+
+def prefilled_invoices(factory, rows):
+    """rows invoices, built from a pool of templates so large sheets fill quickly"""
+    pool = factory.invoices(min(rows, TEMPLATE_POOL), min_items=1, max_items=5)
+    start = pool[0]['invoice_number']
+    invoices = [
+        dict(pool[i % len(pool)], invoice_number=start + i)
+        for i in range(rows)
+    ]
+    factory.next_number = start + rows
+    return invoices
+
+
+def sheets_manager(spreadsheet):
+    # A private client with no quota, so only the fake latency is measured
+    client = SheetsClient(requests_per_minute=10 ** 9, burst=10 ** 9)
+    return GoogleSheetsDataManager("benchmark", client=client, spreadsheet=spreadsheet)
+
+
+def bench_storage(rows, latency, ops, seed):
+    factory = InvoiceFactory(seed=seed)
+    invoices = prefilled_invoices(factory, rows)
+    spreadsheet = invoice_sheet(invoices, latency=latency / 1000)
+    params = {"rows": rows, "latency_ms": latency}
+    rng = random.Random(seed)
+    numbers = [rng.choice(invoices)['invoice_number'] for _ in range(ops)]
+    results = []
+
+    # Cold: a fresh manager per lookup, so each one builds the row index
+    samples, wall = timed_calls(lambda number: sheets_manager(spreadsheet).get_invoice_by_number(number), numbers[:5])
+    results.append(summarize("lookup_cold", samples, wall, **params))
+
+    manager = sheets_manager(spreadsheet)
+    manager.get_invoice_by_number(numbers[0])
+    samples, wall = timed_calls(manager.get_invoice_by_number, numbers)
+    results.append(summarize("lookup_warm", samples, wall, **params))
+
+    samples, wall = timed_calls(lambda _: manager.get_next_invoice_number(), range(ops))
+    results.append(summarize("next_number", samples, wall, **params))
+    samples, wall = timed_calls(lambda _: manager.claim_next_invoice_number(), range(ops))
+    results.append(summarize("claim_number", samples, wall, **params))
+
+    new_invoices = factory.invoices(ops, min_items=1, max_items=10)
+    samples, wall = timed_calls(manager.save_invoice, new_invoices)
+    results.append(summarize("save", samples, wall, **params))
+    return results
+
+
+def bench_render(item_counts, ops, seed):
+    factory = InvoiceFactory(seed=seed)
+    generator = InvoiceGenerator()
+    generator.generate_invoice_bytes(factory.invoice(1))  # fonts and styles
+    results = []
+    for items in item_counts:
+        invoices = factory.invoices(max(3, ops // max(1, items // 10)), item_count=items)
+        samples, wall = timed_calls(generator.generate_invoice_bytes, invoices)
+        results.append(summarize("render", samples, wall, items=items))
+    return results
+
+
+def bench_submit(rows, latency, ops, seed, workers=8):
+    factory = InvoiceFactory(seed=seed)
+    spreadsheet = invoice_sheet(prefilled_invoices(factory, rows), latency=latency / 1000)
+    generator = InvoiceGenerator()
+    params = {"rows": rows, "latency_ms": latency}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = InvoiceWriteQueue(sheets_manager(spreadsheet), spool_path=os.path.join(tmp, "spool.jsonl"))
+        store = CachedDataManager(queue)
+        pipeline = SubmissionPipeline(store, generator.generate_invoice_bytes)
+
+        def submit(invoice):
+            invoice = dict(invoice, invoice_number=store.claim_next_invoice_number())
+            pipeline.submit(invoice).wait()
+
+        samples, wall = timed_calls(submit, factory.invoices(ops, min_items=1, max_items=10))
+        results.append(summarize("submit", samples, wall, **params))
+
+        invoices = factory.invoices(ops, min_items=1, max_items=10)
+        samples = []
+
+        def timed_submit(invoice):
+            start = time.perf_counter()
+            submit(invoice)
+            samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(timed_submit, invoices))
+        results.append(summarize("submit_parallel", samples, time.perf_counter() - start, workers=workers, **params))
+        queue.close()
+    return results
+
+
+def _fragment_id(app, name):
+    """Id of the fragment wrapping the function called name, as registered by the last run"""
+    for fragment_id, fragment in app._fragment_storage._fragments.items():
+        functions = [fragment]
+        while functions:
+            function = functions.pop()
+            if getattr(function, "__module__", None) == "__main__" and function.__name__ == name:
+                return fragment_id
+            functions.extend(
+                cell.cell_contents for cell in getattr(function, "__closure__", None) or ()
+                if callable(cell.cell_contents)
+            )
+    raise LookupError(name)
+
+
+def bench_edit(rows, latency, ops, seed):
+    """Server time and Sheets requests for one quantity edit, full rerun against fragment rerun"""
+    from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+    from streamlit.testing.v1 import AppTest, local_script_runner
+    from utils import backend
+
+    factory = InvoiceFactory(seed=seed)
+    spreadsheet = invoice_sheet(prefilled_invoices(factory, rows), latency=latency / 1000)
+    params = {"rows": rows, "latency_ms": latency}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, INVENTORY_LEDGER_PATH=os.path.join(tmp, "ledger.jsonl")):
+        queue = InvoiceWriteQueue(sheets_manager(spreadsheet), spool_path=os.path.join(tmp, "spool.jsonl"))
+        # A fresh set of process singletons, built on the fake sheet
+        backend._instances.clear()
+        backend._instances["data_manager"] = CachedDataManager(queue)
+        app = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=60).run()
+        app.selectbox(key="product_name_0").select(factory.invoice(1)["items"][0]["product_name"]).run()
+        # What the runtime sends when a widget inside the line-item fragment changes
+        fragment_rerun = partial(RerunData, fragment_id_queue=[_fragment_id(app, "line_items_editor")])
+
+        for name, rerun_data in (("edit_full", RerunData), ("edit_fragment", fragment_rerun)):
+            samples, requests = [], 0
+            start = time.perf_counter()
+            for quantity in range(1, ops + 1):
+                calls = sum(spreadsheet.calls().values())
+                call_start = time.perf_counter()
+                with mock.patch.object(local_script_runner, "RerunData", rerun_data):
+                    app.number_input(key="quantity_0").set_value(quantity).run()
+                samples.append(time.perf_counter() - call_start)
+                requests += sum(spreadsheet.calls().values()) - calls
+            if app.exception:
+                raise RuntimeError(f"main.py raised: {app.exception[0].value}")
+            record = summarize(name, samples, time.perf_counter() - start, **params)
+            record["requests_per_op"] = round(requests / ops, 2)
+            results.append(record)
+        queue.close()
+        ledger = backend._instances.get("stock_ledger")
+        if ledger is not None:
+            ledger.close()
+            atexit.unregister(ledger.close)  # its files go with tmp
+        backend._instances.clear()
+    return results
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "ops": args.ops,
+    }
+
+
+def _key(record):
+    return tuple((k, record.get(k)) for k in ("benchmark", "rows", "latency_ms", "items", "workers"))
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {_key(record): record for record in json.load(f)["results"]}
+    regressions = []
+    for record in results:
+        old = baseline.get(_key(record))
+        if not old or not old["p50_ms"]:
+            continue
+        ratio = record["p50_ms"] / old["p50_ms"]
+        marker = "  REGRESSION" if ratio > threshold else ""
+        print(f"{_label(record):55s} p50 {old['p50_ms']:9.3f} -> {record['p50_ms']:9.3f} ms ({ratio:.2f}x){marker}")
+        if marker:
+            regressions.append(record)
+    return regressions
+
+
+def _label(record):
+    parts = [record["benchmark"]]
+    for key in ("rows", "latency_ms", "items", "workers"):
+        if key in record:
+            parts.append(f"{key}={record[key]}")
+    return " ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=_int_list, default=[1000, 20000], help="sheet sizes, e.g. 1000,200000")
+    parser.add_argument("--latency-ms", type=_int_list, default=[0, 50], help="fake API latency per call")
+    parser.add_argument("--items", type=_int_list, default=[1, 10, 100], help="line items per rendered invoice")
+    parser.add_argument("--ops", type=int, default=50, help="operations per measurement")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write results as JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 slowdown counted as a regression")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        for latency in args.latency_ms:
+            print(f"storage: {rows} rows, {latency} ms latency", file=sys.stderr)
+            results.extend(bench_storage(rows, latency, args.ops, args.seed))
+            results.extend(bench_submit(rows, latency, args.ops, args.seed))
+            results.extend(bench_edit(rows, latency, args.ops, args.seed))
+    print("render", file=sys.stderr)
+    results.extend(bench_render(args.items, args.ops, args.seed))
+
+    for record in results:
+        requests = f"  {record['requests_per_op']:5.2f} requests/op" if "requests_per_op" in record else ""
+        print(f"{_label(record):55s} p50 {record['p50_ms']:9.3f} ms  p95 {record['p95_ms']:9.3f} ms  "
+              f"{record['ops_per_s'] or 0:9.1f} ops/s{requests}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": metadata(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.out}", file=sys.stderr)
+
+    if args.baseline and compare(results, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Synthetic invoices for benchmarks, reproducible from a seed.
+
+Products and rates come from the catalog, and line items are priced with
+the same engine as the app, so rendered PDFs and stored rows look like
+real ones.
+"""
+import random
+from datetime import date, timedelta
+from utils.catalog import load_catalog
+from utils.pricing import price_lines
+
+CUSTOMERS = [
+    ("Khyber Auto Store", "Shop 12, University Road, Peshawar"),
+    ("Ali Traders", "Main Bazaar, Mardan"),
+    ("Frontier Lubricants", "G.T. Road, Nowshera"),
+    ("Swat Motors", "Mingora Chowk, Swat"),
+    ("Hazara Auto Parts", "Mansehra Road, Abbottabad"),
+]
+BOOKERS = ["Zubair Khan (0315-9288706)", "Imran Ali (0300-1234567)"]
+
+
+class InvoiceFactory:
+    def __init__(self, seed=0, start_number=1050, start_date=date(2025, 1, 1), invoices_per_day=40):
+        self.random = random.Random(seed)
+        self.products = load_catalog().products
+        self.next_number = start_number
+        self.start_date = start_date
+        self.invoices_per_day = invoices_per_day
+
+    def items(self, count):
+        chosen = [self.random.choice(self.products) for _ in range(count)]
+        quantities = [self.random.randint(1, 10) * p.units_per_ctn for p in chosen]
+        discounts = [self.random.choice([0, 0, 2.5, 5, 10]) for _ in chosen]
+        priced = price_lines([p.rate for p in chosen], quantities, discounts)
+        return [
+            {
+                'product_name': p.name,
+                'units_per_coton': p.units_per_ctn,
+                'quantity': quantities[i],
+                'unit_rate': p.rate,
+                'discount_percent': discounts[i],
+                'discount_amount': float(priced.discount_amount[i]),
+                'net_rate': float(priced.net_rate[i]),
+                'total_price': float(priced.total_price[i]),
+            }
+            for i, p in enumerate(chosen)
+        ], priced.total_amount
+
+    def invoice(self, item_count=None, min_items=1, max_items=10):
+        if item_count is None:
+            item_count = self.random.randint(min_items, max_items)
+        number = self.next_number
+        self.next_number += 1
+        customer_name, customer_address = self.random.choice(CUSTOMERS)
+        items, total_amount = self.items(item_count)
+        day = self.start_date + timedelta(days=(number - 1050) // self.invoices_per_day)
+        return {
+            'invoice_number': number,
+            'customer_name': customer_name,
+            'customer_address': customer_address,
+            'items': items,
+            'total_amount': total_amount,
+            'order_booker_name': self.random.choice(BOOKERS),
+            'date': day.isoformat(),
+        }
+
+    def invoices(self, count, item_count=None, min_items=1, max_items=10):
+        return [self.invoice(item_count, min_items, max_items) for _ in range(count)]
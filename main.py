@@ -1,377 +1,530 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-# from utils.google_sheets_data_manager import GoogleSheetsDataManager
-from utils.google_sheets_data_manager import data_manager
-from utils.invoice_generator import InvoiceGenerator
-
-# Initialize data manager
-# data_manager = GoogleSheetsDataManager(sheet_name="invoices")
-invoice_generator = InvoiceGenerator()
+from utils.backend import (
+    get_customer_registry, get_data_manager, get_invoice_search, get_stock_ledger, get_submission_pipeline, render_invoice_pdf
+)
+from utils.storage import get_setting
+from utils.batch_export import export_invoices, pdf_file_name
+from utils.catalog import get_catalog
+from utils.instrumentation import span, timed
+from utils.page_style import setup_page
+from utils.pricing import price_frame, price_lines
 
 # Page configuration
-st.set_page_config(
-    page_title="Invoice Generator",
-    page_icon="📄",
-    layout="wide"
-)
-hide_button="""
-    <style> 
-        header{
-        visibility:hidden;
-        }
-    </style>"""
-st.markdown(hide_button, unsafe_allow_html=True)
-
-hide_streamlit_style = """
-    <style>
-        footer {visibility: hidden;}
-    </style>
-"""
-st.markdown(hide_streamlit_style, unsafe_allow_html=True)
-
-# Load custom CSS
-with open('styles/custom.css') as f:
-    st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-
-# Add sidebar for downloading invoice by number
-st.sidebar.header("Download Invoice")
-download_invoice_number = st.sidebar.text_input("Enter Invoice Number")
-download_btn = st.sidebar.button("Download Invoice")
-
-if download_btn and download_invoice_number:
-    invoice = data_manager.get_invoice_by_number(download_invoice_number)
-    if invoice:
-        import tempfile
-        safe_customer_name = "".join(x for x in invoice.get('customer_name', '') if x.isalnum() or x.isspace()).strip()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            pdf_path = tmp_file.name
-        invoice_generator.generate_invoice(invoice, pdf_path)
-        with open(pdf_path, "rb") as pdf_file:
-            pdf_bytes = pdf_file.read()
-        st.sidebar.download_button(
-            label=f"Download Invoice #{download_invoice_number} PDF",
-            data=pdf_bytes,
-            file_name=f"{safe_customer_name}_{download_invoice_number}.pdf",
-            mime="application/pdf"
-        )
-    else:
-        st.sidebar.error("Invoice not found.")
-
-# Initialize session state for products
-if 'num_products' not in st.session_state:
-    st.session_state.num_products = 1
-
-st.title("Generate Invoice #" + str(data_manager.get_next_invoice_number()))
-
-order_booker_options = [
-    "Zubair Khan (0315-9288706)",
-    "Other"
-]
-
-# Invoice generation form (no form)
-# form = st.form("invoice_form")
-# with form:
-# Customer and sender details
-col1, col2 = st.columns(2)
-
-with col1:
-    st.subheader("Customer Details")
-    customer_name = st.text_input("Customer Name")
-    customer_address = st.text_area("Customer Address")
-
-with col2:
-    st.subheader("Order Booker")
-    order_booker_name = st.selectbox(
-        "Order Booker Name",
-        order_booker_options,
-        key="order_booker_name"
-    )
-    if order_booker_name == "Other":
-        final_order_booker_name = st.text_input(
-            "Enter custom order booker name",
-            key="custom_order_booker_name"
-        )
-    else:
-        final_order_booker_name = order_booker_name
-
-# Product details
-st.subheader("Product Details")
-
-# Dynamic product rows
-products = []
-
-product_options = [
-    "",
-    "Other",
-    "SHAMPOO STRIPS 20 ML (12 Strips)",
-    "VELVET SHAMPOO 300ML",
-    "VELVET SHAMPOO 500ML",
-    "VELVET SHAMPOO 4L",
-    "GLASS CLEANER 500ML",
-    "WATERLESS CAR WASH 500ML",
-    "ENGINE DEGREASER 500ML",
-    "ALL PURPOSE CLEANER 500ML",
-    "RUST PREVENTIVE 500 ML",
-    "TIRE POLISH 200ML",
-    "CAR DASHBOARD CLEANER 200 ML",
-    "INTERIOR DRESSING 500 ML",
-    "TIRE DRESSING 500 ML",
-    "RADIATOR COOLANT RED OVER-HEAT PREVENTIVE (1L)",
-    "RADIATOR COOLANT GREEN OVER-HEAT PREVENTIVE (1L)",
-    "RADIATOR COOLANT GREEN SUPER ANTI-FREEZE (1L)",
-    "RADIATOR COOLANT RED SUPER ANTI-FREEZE (1L)",
-    "RADIATOR COOLANT GREEN OVER-HEAT PREVENTIVE (4L)",
-    "RADIATOR COOLANT RED OVER-HEAT PREVENTIVE (4L)",
-    "RADIATOR COOLANT GREEN SUPER ANTI-FREEZE (4L)",
-    "RADIATOR COOLANT RED SUPER ANTI-FREEZE (4L)",
-    "COMPLETE KIT BOX",
-    "DASHBOARD WAX SPRAY (ROSE) 450ML",
-    "DASHBOARD WAX SPRAY (STRAWBERRY) 450ML",
-    "DASHBOARD WAX SPRAY (LEMON) 450ML",
-    "DASHBOARD WAX SPRAY (JASMINE) 450ML",
-    "DASHBOARD WAX SPRAY (COLOGNE) 450ML",
-    "DASHBOARD WAX SPRAY (OCEAN) 450ML",
-    "INJECTOR CLEANER 450 ML",
-    "INJECTOR CLEANER 300 ML",
-    "TIRE FOAM 650 ML",
-    "MULTI PURPOSE FOAM CLEANER 650 ML",
-    "ENGINE SURFACE CLEANER 650ML",
-    "ANTIRUST LUBRICANT 100 ML",
-    "ANTIRUST LUBRICANT 220 ML",
-    "HARD PASTE CAR WAX 180 GRM",
-    "TONE ROYALITY FOR HER",
-    "TONE WONDER FOR HER",
-    "TONE VAPOR FOR ALL",
-    "TONE MYSTERY FOR ALL",        
-]
-
-product_rates = {
-    "" : 0,
-    "SHAMPOO STRIPS 20 ML (12 Strips)" : 150,
-    "VELVET SHAMPOO 300ML" : 350,
-    "VELVET SHAMPOO 500ML": 460,
-    "VELVET SHAMPOO 4L":2650,
-    "GLASS CLEANER 500ML":350,
-    "WATERLESS CAR WASH 500ML":620,
-    "ENGINE DEGREASER 500ML":620,
-    "ALL PURPOSE CLEANER 500ML":620,
-    "RUST PREVENTIVE 500 ML":1050,
-    "TIRE POLISH 200ML":460,
-    "CAR DASHBOARD CLEANER 200 ML":390,
-    "INTERIOR DRESSING 500 ML":660,
-    "TIRE DRESSING 500 ML":790,
-    "RADIATOR COOLANT RED OVER-HEAT PREVENTIVE (1L)":530,
-    "RADIATOR COOLANT GREEN OVER-HEAT PREVENTIVE (1L)":530,
-    "RADIATOR COOLANT GREEN SUPER ANTI-FREEZE (1L)":790,
-    "RADIATOR COOLANT RED SUPER ANTI-FREEZE (1L)":790,
-    "RADIATOR COOLANT GREEN OVER-HEAT PREVENTIVE (4L)":1950,
-    "RADIATOR COOLANT RED OVER-HEAT PREVENTIVE (4L)":1950,
-    "RADIATOR COOLANT GREEN SUPER ANTI-FREEZE (4L)":2720,
-    "RADIATOR COOLANT RED SUPER ANTI-FREEZE (4L)":2720,
-    "COMPLETE KIT BOX":4920,
-    "DASHBOARD WAX SPRAY (ROSE) 450ML":350,
-    "DASHBOARD WAX SPRAY (STRAWBERRY) 450ML":350,
-    "DASHBOARD WAX SPRAY (LEMON) 450ML":350,
-    "DASHBOARD WAX SPRAY (JASMINE) 450ML":350,
-    "DASHBOARD WAX SPRAY (COLOGNE) 450ML":350,
-    "DASHBOARD WAX SPRAY (OCEAN) 450ML":350,
-    "INJECTOR CLEANER 450 ML":350,
-    "INJECTOR CLEANER 300 ML":250,
-    "TIRE FOAM 650 ML":420,
-    "MULTI PURPOSE FOAM CLEANER 650 ML":390,
-    "ENGINE SURFACE CLEANER 650ML":420,
-    "ANTIRUST LUBRICANT 100 ML":190,
-    "ANTIRUST LUBRICANT 220 ML":300,
-    "HARD PASTE CAR WAX 180 GRM":700,
-    "TONE ROYALITY FOR HER":580,
-    "TONE WONDER FOR HER":580,
-    "TONE VAPOR FOR ALL":580,
-    "TONE MYSTERY FOR ALL":580,
-}
-
-units_per_coton = {
-    "" : 0,
-    "SHAMPOO STRIPS 20 ML (12 Strips)" : 12,
-    "VELVET SHAMPOO 300ML" : 24,
-    "VELVET SHAMPOO 500ML": 12,
-    "VELVET SHAMPOO 4L" : 4,
-    "GLASS CLEANER 500ML":12,
-    "WATERLESS CAR WASH 500ML":12,
-    "ENGINE DEGREASER 500ML":12,
-    "ALL PURPOSE CLEANER 500ML":12,
-    "RUST PREVENTIVE 500 ML":12,
-    "TIRE POLISH 200ML":24,
-    "CAR DASHBOARD CLEANER 200 ML":24,
-    "INTERIOR DRESSING 500 ML":12,
-    "TIRE DRESSING 500 ML":12,
-    "RADIATOR COOLANT RED OVER-HEAT PREVENTIVE (1L)":12,
-    "RADIATOR COOLANT GREEN OVER-HEAT PREVENTIVE (1L)":12,
-    "RADIATOR COOLANT GREEN SUPER ANTI-FREEZE (1L)":12,
-    "RADIATOR COOLANT RED SUPER ANTI-FREEZE (1L)":12,
-    "RADIATOR COOLANT GREEN OVER-HEAT PREVENTIVE (4L)":4,
-    "RADIATOR COOLANT RED OVER-HEAT PREVENTIVE (4L)":4,
-    "RADIATOR COOLANT GREEN SUPER ANTI-FREEZE (4L)":4,
-    "RADIATOR COOLANT RED SUPER ANTI-FREEZE (4L)":4,
-    "COMPLETE KIT BOX":3,
-    "DASHBOARD WAX SPRAY (ROSE) 450ML":24,
-    "DASHBOARD WAX SPRAY (STRAWBERRY) 450ML":24,
-    "DASHBOARD WAX SPRAY (LEMON) 450ML":24,
-    "DASHBOARD WAX SPRAY (JASMINE) 450ML":24,
-    "DASHBOARD WAX SPRAY (COLOGNE) 450ML":24,
-    "DASHBOARD WAX SPRAY (OCEAN) 450ML":24,
-    "INJECTOR CLEANER 450 ML":24,
-    "INJECTOR CLEANER 300 ML":24,
-    "TIRE FOAM 650 ML":12,
-    "MULTI PURPOSE FOAM CLEANER 650 ML":12,
-    "ENGINE SURFACE CLEANER 650ML":12,
-    "ANTIRUST LUBRICANT 100 ML":48,
-    "ANTIRUST LUBRICANT 220 ML":24,
-    "HARD PASTE CAR WAX 180 GRM":12,
-    "TONE ROYALITY FOR HER":96,
-    "TONE WONDER FOR HER":96,
-    "TONE VAPOR FOR ALL":96,
-    "TONE MYSTERY FOR ALL":96,
-}
-
-tab_space = "&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;"
-    
-# --- Add this callback function at the top, after product_rates is defined ---
-def update_unit_rate(i):
-    product_name = st.session_state.get(f"product_name_{i}", "")
-    if product_name == "Other":
-        st.session_state[f"unit_rate_{i}"] = 0
-    else:
-        st.session_state[f"unit_rate_{i}"] = product_rates.get(product_name, 0)
-
-for i in range(st.session_state.num_products):
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        product_name = st.selectbox(
-            f"  {i+1} Product Name",
-            product_options,
-            key=f"product_name_{i}",
-            on_change=update_unit_rate,
-            args=(i,)
-        )
-        if product_name == "Other":
-            custom_name = st.text_input(
-                f"Enter custom product name for item {i+1}",
-                key=f"custom_product_name_{i}"
+setup_page("Invoice Generator")
+
+# A with block, so runs cut short by st.rerun() or st.stop() are timed too
+with span("script.run", page="main"):
+    # The page is split into fragments: a widget change reruns only its own
+    # fragment, not the whole script. Values shared between fragments go
+    # through st.session_state.
+
+
+    @st.fragment
+    @timed("fragment.run", fragment="download")
+    def invoice_download():
+        """Sidebar: download invoice by number"""
+        st.header("Download Invoice")
+        download_invoice_number = st.text_input("Enter Invoice Number")
+        download_btn = st.button("Download Invoice")
+
+        if download_btn and download_invoice_number:
+            invoice = get_data_manager().get_invoice_by_number(download_invoice_number)
+            if invoice:
+                pdf_bytes = render_invoice_pdf(invoice)
+                st.download_button(
+                    label=f"Download Invoice #{download_invoice_number} PDF",
+                    data=pdf_bytes,
+                    file_name=pdf_file_name(invoice),
+                    mime="application/pdf"
+                )
+            else:
+                st.error("Invoice not found.")
+
+
+    @st.fragment
+    @timed("fragment.run", fragment="batch_export")
+    def batch_export():
+        """Sidebar: export many invoices at once, e.g. for month-end accounting"""
+        with st.expander("Batch Export"):
+            export_by = st.radio("Select invoices by", ["Invoice number", "Date"], key="export_by")
+            export_range = {}
+            if export_by == "Invoice number":
+                export_range['first_number'] = st.number_input("From invoice #", min_value=0, step=1, key="export_from")
+                export_range['last_number'] = st.number_input("To invoice #", min_value=0, step=1, key="export_to")
+            else:
+                today = datetime.now().date()
+                export_dates = st.date_input("Date range", value=(today - timedelta(days=30), today), key="export_dates")
+                if len(export_dates) == 2:
+                    export_range['start_date'] = export_dates[0].strftime('%Y-%m-%d')
+                    export_range['end_date'] = export_dates[1].strftime('%Y-%m-%d')
+            export_format = st.radio("Output", ["ZIP of PDFs", "Merged PDF"], key="export_format")
+
+            if st.button("Export Invoices") and export_range:
+                progress_bar = st.progress(0.0, text="Fetching invoices...")
+                output, exported, errors = export_invoices(
+                    get_data_manager(),
+                    output_format="pdf" if export_format == "Merged PDF" else "zip",
+                    progress=lambda done, total: progress_bar.progress(done / total, text=f"Rendered {done}/{total}"),
+                    **export_range
+                )
+                if exported:
+                    st.download_button(
+                        label=f"Download {exported} invoices",
+                        data=output,
+                        file_name="invoices.pdf" if export_format == "Merged PDF" else "invoices.zip",
+                        mime="application/pdf" if export_format == "Merged PDF" else "application/zip"
+                    )
+                else:
+                    st.warning("No invoices found in that range.")
+                for number, error in errors:
+                    st.error(f"Invoice #{number} failed: {error}")
+
+
+    @st.fragment
+    @timed("fragment.run", fragment="invoice_search")
+    def invoice_search():
+        """Sidebar: find invoices by customer, order booker, product and date"""
+        with st.expander("Search Invoices"):
+            customer = st.text_input("Customer", key="search_customer", placeholder="e.g. khyber auto")
+            order_booker = st.text_input("Order booker", key="search_booker", placeholder="e.g. zubair")
+            product = st.text_input("Product", key="search_product", placeholder="e.g. coolant")
+            date_range = {}
+            if st.checkbox("Filter by date", key="search_by_date"):
+                today = datetime.now().date()
+                search_dates = st.date_input("Date range", value=(today - timedelta(days=30), today), key="search_dates")
+                if len(search_dates) == 2:
+                    date_range = {'start_date': search_dates[0].isoformat(), 'end_date': search_dates[1].isoformat()}
+
+            # Expander contents run even when collapsed; read the index only once asked
+            if not (customer or order_booker or product or date_range):
+                st.caption("Enter a customer, order booker or product, or pick a date range.")
+                return
+
+            # A changed query starts again from the first page
+            query = (customer, order_booker, product, tuple(date_range.values()))
+            if st.session_state.get('search_query') != query:
+                st.session_state.search_query = query
+                st.session_state.search_page = 0
+            page = st.session_state.search_page
+
+            results = get_invoice_search().search(
+                customer=customer, order_booker=order_booker, product=product, page=page, page_size=10, **date_range
             )
-            final_product_name = custom_name
-        else:
-            final_product_name = product_name
-    with col2:
-        quantity = st.number_input(f"Quantity", min_value=0, key=f"quantity_{i}")
-    with col3:
-        if product_name == "Other":
-            unit_rate = st.number_input(
-                "Unit Rate",
-                min_value=0,
-                key=f"unit_rate_{i}",
-                disabled=False
+            if not results['total']:
+                st.info("No matching invoices.")
+                return
+            st.caption(f"{results['total']} invoices · page {page + 1} of {results['pages']}")
+            st.dataframe(
+                [{
+                    "#": invoice['invoice_number'],
+                    "Date": invoice['date'],
+                    "Customer": invoice['customer_name'],
+                    "Total": f"{invoice['total_amount']:,.2f}",
+                } for invoice in results['invoices']],
+                hide_index=True,
+                width="stretch",
             )
-        else:
-            unit_rate = st.number_input(
-                "Unit Rate",
-                min_value=0,
-                key=f"unit_rate_{i}",
-                disabled=True
+
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("‹ Newer", key="search_newer", disabled=page == 0):
+                    st.session_state.search_page -= 1
+                    st.rerun(scope="fragment")
+            with col2:
+                if st.button("Older ›", key="search_older", disabled=page + 1 >= results['pages']):
+                    st.session_state.search_page += 1
+                    st.rerun(scope="fragment")
+
+            selected = st.selectbox("Invoice", [invoice['invoice_number'] for invoice in results['invoices']], key="search_selected")
+            if st.button("Prepare PDF", key="search_pdf"):
+                invoice = get_data_manager().get_invoice_by_number(selected)
+                if invoice:
+                    st.download_button(
+                        label=f"Download Invoice #{selected} PDF",
+                        data=render_invoice_pdf(invoice),
+                        file_name=pdf_file_name(invoice),
+                        mime="application/pdf",
+                        key="search_download"
+                    )
+                else:
+                    st.error("Invoice not found.")
+
+
+    with st.sidebar:
+        invoice_download()
+        invoice_search()
+        batch_export()
+
+    # Initialize session state for products
+    if 'num_products' not in st.session_state:
+        st.session_state.num_products = 1
+
+    # Filled in once the form is on screen: the first call opens the backend
+    title = st.empty()
+
+    order_booker_options = [
+        "Zubair Khan (0315-9288706)",
+        "Other"
+    ]
+
+
+    def fill_customer():
+        """Autofill name and address from the customer picked in the search results"""
+        customer = get_customer_registry().get(st.session_state.get("customer_match", ""))
+        if customer is not None:
+            st.session_state["customer_name"] = customer.name
+            st.session_state["customer_address"] = customer.address
+
+
+    @st.fragment
+    @timed("fragment.run", fragment="customer_details")
+    def customer_details():
+        # Customer and sender details
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.subheader("Customer Details")
+            # Previous customers, so a shop is not retyped (and misspelled) on every order
+            customer_search = st.text_input("Find existing customer", key="customer_search", placeholder="e.g. khyber auto")
+            if customer_search:
+                matches = get_customer_registry().search(customer_search)
+                if matches:
+                    st.selectbox("Matching customers", [""] + matches, key="customer_match", on_change=fill_customer)
+                else:
+                    st.caption("No matching customer; enter the details below.")
+            st.text_input("Customer Name", key="customer_name")
+            st.text_area("Customer Address", key="customer_address")
+
+        with col2:
+            st.subheader("Order Booker")
+            order_booker_name = st.selectbox(
+                "Order Booker Name",
+                order_booker_options,
+                key="order_booker_name"
             )
-    with col4:
-        discount_percent = st.number_input(f"Discount (%)", min_value=0, max_value=100, key=f"discount_{i}")
+            if order_booker_name == "Other":
+                st.text_input(
+                    "Enter custom order booker name",
+                    key="custom_order_booker_name"
+                )
 
-    # units per ctn
-    if final_product_name in units_per_coton:
-            units_per_coton_value = units_per_coton[final_product_name]
-    else:
-        units_per_coton_value = st.number_input(
-            f"Units/Ctn",
-            min_value=0,
-            key=f"units_per_coton_value_{i}"
+
+    customer_details()
+
+    tab_space = "&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;"
+    
+    GRID_COLUMNS = ['product_name', 'custom_product_name', 'quantity', 'unit_rate', 'units_per_coton', 'discount_percent']
+
+
+    def line_item_grid(catalog):
+        """All line items in one editable table; rate and units/ctn come from the catalog"""
+        # pandas takes ~0.5 s to import; only grid mode pays for it
+        import pandas as pd
+
+        edited = st.data_editor(
+            pd.DataFrame({column: pd.Series(dtype="object" if column.endswith("name") else "float") for column in GRID_COLUMNS}),
+            key="line_item_grid",
+            num_rows="dynamic",
+            width="stretch",
+            column_config={
+                'product_name': st.column_config.SelectboxColumn("Product Name", options=catalog.options[1:], required=True),
+                'custom_product_name': st.column_config.TextColumn("Custom Name (Other)"),
+                'quantity': st.column_config.NumberColumn("Quantity", min_value=0, step=1),
+                'unit_rate': st.column_config.NumberColumn("Unit Rate (Other)", min_value=0, step=0.01),
+                'units_per_coton': st.column_config.NumberColumn("Units/Ctn (Other)", min_value=0, step=1),
+                'discount_percent': st.column_config.NumberColumn("Discount (%)", min_value=0, max_value=100, step=0.01),
+            }
         )
 
-    discount_amount = (unit_rate) * (discount_percent / 100)
-    net_rate = unit_rate - discount_amount
-    total_price = (quantity * net_rate)
-
-    if final_product_name and quantity > 0:
-        products.append({
-            'product_name': final_product_name,
-            'units_per_coton': units_per_coton_value,
-            'quantity': quantity,
-            'unit_rate': unit_rate,
-            'discount_percent': discount_percent,
-            'discount_amount': discount_amount,
-            'net_rate' : net_rate,
-            'total_price': total_price
-        })
-        print(products)
-
-# Submit button (outside of any form)
-submitted = st.button("Generate Invoice")
-
-# Add/Remove product buttons
-col1, col2 = st.columns([10, 4])
-with col1:
-    # if st.button(f"➕ Add Product ({30-st.session_state.num_products} Items)"):
-    if st.button(f"➕ Add Product"):
-        st.session_state.num_products += 1
-        # st.experimental_rerun()
-        st.rerun()
-with col2:
-    if st.session_state.num_products > 1 and st.button("➖ Remove Last Product"):
-        st.session_state.num_products -= 1
-        # st.experimental_rerun()
-        st.rerun()
-
-# Handle form submission outside the form
-if submitted:
-    # if st.session_state.num_products <= 30:
-        if customer_name and customer_address and products:
-
-            # Calculate total amount and price
-            total_amount = sum(item['quantity'] * item['net_rate'] for item in products)
-
-            # Generate invoice number
-            invoice_number = data_manager.get_next_invoice_number()
-
-            # Prepare invoice data
-            invoice_data = {
-                'invoice_number': invoice_number,
-                'customer_name': customer_name,
-                'customer_address': customer_address,
-                # 'sender_name': sender_name,
-                'items': products,
-                'total_amount': total_amount,
-                'order_booker_name' : final_order_booker_name,
-                'date': datetime.now().strftime('%Y-%m-%d')
+        # Catalog products take their rate and units/ctn from the catalog
+        df = edited.copy()
+        is_other = df['product_name'] == "Other"
+        df['unit_rate'] = df['product_name'].map(catalog.rates).where(~is_other, df['unit_rate'])
+        df['units_per_coton'] = df['product_name'].map(catalog.units_per_ctn).where(~is_other, df['units_per_coton'])
+        df['product_name'] = df['product_name'].where(~is_other, df['custom_product_name'])
+        df = df.fillna({'unit_rate': 0, 'units_per_coton': 0, 'quantity': 0, 'discount_percent': 0})
+        df = df[df['product_name'].fillna("").astype(str).str.strip().astype(bool) & (df['quantity'] > 0)]
+
+        if not df.empty:
+            try:
+                preview = price_frame(df.drop(columns=['custom_product_name']))
+                st.dataframe(preview, hide_index=True, width="stretch")
+            except ValueError:
+                pass  # reported when the lines are priced below
+
+        return [
+            {
+                'product_name': row.product_name,
+                'units_per_coton': int(row.units_per_coton),
+                'quantity': int(row.quantity),
+                'unit_rate': row.unit_rate,
+                'discount_percent': row.discount_percent,
             }
+            for row in df.itertuples(index=False)
+        ]
 
-            # Save invoice data
-            data_manager.save_invoice(invoice_data)
 
-            # Generate PDF
-            os.makedirs('generated_invoices', exist_ok=True)
-            safe_customer_name = "".join(x for x in customer_name if x.isalnum() or x.isspace()).strip()
-            pdf_path = f"generated_invoices/{safe_customer_name}_{invoice_number}.pdf"
-            invoice_generator.generate_invoice(invoice_data, pdf_path)
+    # --- Add this callback function at the top, after product_rates is defined ---
+    def update_unit_rate(i, product_rates):
+        product_name = st.session_state.get(f"product_name_{i}", "")
+        if product_name == "Other":
+            st.session_state[f"unit_rate_{i}"] = 0
+        else:
+            st.session_state[f"unit_rate_{i}"] = product_rates.get(product_name, 0)
 
-            # Success message and download button (outside form)
-            st.success(f"Invoice #{invoice_number} generated successfully!")
 
-            # Open and provide PDF for download
-            with open(pdf_path, "rb") as pdf_file:
-                bytes_data = pdf_file.read()
-                st.download_button(
-                    label="Download Invoice PDF",
-                    data=bytes_data,
-                    file_name=f"{safe_customer_name}_{invoice_number}.pdf",
-                    mime="application/pdf"
-                )
+    @st.fragment
+    @timed("fragment.run", fragment="line_items")
+    def line_items_editor():
+        # Product details
+        st.subheader("Product Details")
+
+        # Dynamic product rows; priced together once all rows are read
+        line_items = []
+
+        # Product catalog (data/products.json), shared across reruns and reloaded when the file changes
+        catalog = get_catalog()
+        product_rates = catalog.rates
+        units_per_coton = catalog.units_per_ctn
+
+        entry_mode = st.radio(
+            "Line item entry",
+            ["Rows", "Grid"],
+            horizontal=True,
+            key="entry_mode",
+            help="Grid is one editable table; use it for large orders."
+        )
+
+        if entry_mode == "Grid":
+            line_items = line_item_grid(catalog)
         else:
-            st.error("Please fill in all required fields and add at least one product")
-    # else:
-    #     st.error("Inovice is FULL! Remove items more than 30 and create a new inovice for it.")
+            # Narrow the product pickers for large catalogs
+            product_search = st.text_input("Search products", key="product_search", placeholder="e.g. coolant red 4l")
+            if product_search:
+                product_options = ["", "Other"] + catalog.search(product_search, limit=50)
+            else:
+                product_options = catalog.options
+
+            for i in range(st.session_state.num_products):
+                # Keep a row's current choice selectable while a search is active
+                row_options = product_options
+                selected_product = st.session_state.get(f"product_name_{i}", "")
+                if selected_product not in row_options:
+                    row_options = row_options + [selected_product]
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    product_name = st.selectbox(
+                        f"  {i+1} Product Name",
+                        row_options,
+                        key=f"product_name_{i}",
+                        on_change=update_unit_rate,
+                        args=(i, product_rates)
+                    )
+                    if product_name == "Other":
+                        custom_name = st.text_input(
+                            f"Enter custom product name for item {i+1}",
+                            key=f"custom_product_name_{i}"
+                        )
+                        final_product_name = custom_name
+                    else:
+                        final_product_name = product_name
+                with col2:
+                    quantity = st.number_input(f"Quantity", min_value=0, key=f"quantity_{i}")
+                with col3:
+                    if product_name == "Other":
+                        unit_rate = st.number_input(
+                            "Unit Rate",
+                            min_value=0,
+                            key=f"unit_rate_{i}",
+                            disabled=False
+                        )
+                    else:
+                        unit_rate = st.number_input(
+                            "Unit Rate",
+                            min_value=0,
+                            key=f"unit_rate_{i}",
+                            disabled=True
+                        )
+                with col4:
+                    discount_percent = st.number_input(f"Discount (%)", min_value=0, max_value=100, key=f"discount_{i}")
+
+                # units per ctn
+                if final_product_name in units_per_coton:
+                        units_per_coton_value = units_per_coton[final_product_name]
+                else:
+                    units_per_coton_value = st.number_input(
+                        f"Units/Ctn",
+                        min_value=0,
+                        key=f"units_per_coton_value_{i}"
+                    )
+
+                if final_product_name and quantity > 0:
+                    line_items.append({
+                        'product_name': final_product_name,
+                        'units_per_coton': units_per_coton_value,
+                        'quantity': quantity,
+                        'unit_rate': unit_rate,
+                        'discount_percent': discount_percent,
+                    })
+
+        products = []
+        try:
+            priced = price_lines(
+                [item['unit_rate'] for item in line_items],
+                [item['quantity'] for item in line_items],
+                [item['discount_percent'] for item in line_items]
+            )
+        except ValueError as e:
+            # Rates are whole paisa and discounts hundredths of a percent
+            st.error(f"Cannot price these items: {e}")
+            line_items = []
+            priced = price_lines([], [], [])
+        for i, item in enumerate(line_items):
+            products.append({
+                **item,
+                'discount_amount': float(priced.discount_amount[i]),
+                'net_rate': float(priced.net_rate[i]),
+                'total_price': float(priced.total_price[i])
+            })
+        st.session_state.products = products
+        st.session_state.total_amount = priced.total_amount
+
+        # Stock check against the in-memory balances (products never stocked are skipped)
+        for item in products:
+            stock = get_stock_ledger().check(item['product_name'], item['quantity'])
+            if stock is None:
+                continue
+            balance_after, is_low = stock
+            in_stock = balance_after + item['quantity']
+            if in_stock <= 0:
+                st.warning(f"{item['product_name']}: out of stock.")
+            elif balance_after < 0:
+                st.warning(f"{item['product_name']}: only {in_stock} pieces in stock.")
+            elif is_low:
+                st.caption(f"⚠️ {item['product_name']}: {balance_after} pieces left after this invoice (low stock).")
+
+        # Add/Remove product buttons (the grid adds rows itself)
+        if entry_mode == "Rows":
+            col1, col2 = st.columns([10, 4])
+            with col1:
+                # if st.button(f"➕ Add Product ({30-st.session_state.num_products} Items)"):
+                if st.button(f"➕ Add Product"):
+                    st.session_state.num_products += 1
+                    # st.experimental_rerun()
+                    st.rerun(scope="fragment")
+            with col2:
+                if st.session_state.num_products > 1 and st.button("➖ Remove Last Product"):
+                    st.session_state.num_products -= 1
+                    # st.experimental_rerun()
+                    st.rerun(scope="fragment")
+
+
+    line_items_editor()
+
+    title.title("Generate Invoice #" + str(get_data_manager().get_next_invoice_number()))
+
+
+    @st.fragment
+    @timed("fragment.run", fragment="submit")
+    def submit_invoice():
+        # Handle form submission
+        submitted = st.button("Generate Invoice")
+
+        if submitted:
+            customer_name = st.session_state.get('customer_name', '')
+            customer_address = st.session_state.get('customer_address', '')
+            products = st.session_state.get('products', [])
+            final_order_booker_name = st.session_state.get('order_booker_name', order_booker_options[0])
+            if final_order_booker_name == "Other":
+                final_order_booker_name = st.session_state.get('custom_order_booker_name', '')
+
+            # if st.session_state.num_products <= 30:
+            if customer_name and customer_address and products:
+
+                    # Total from the pricing engine (exact paisa arithmetic)
+                    total_amount = st.session_state.total_amount
+
+                    # Claim invoice number
+                    invoice_number = get_data_manager().claim_next_invoice_number()
+
+                    # Prepare invoice data
+                    invoice_data = {
+                        'invoice_number': invoice_number,
+                        'customer_name': customer_name,
+                        'customer_address': customer_address,
+                        # 'sender_name': sender_name,
+                        'items': products,
+                        'total_amount': total_amount,
+                        'order_booker_name' : final_order_booker_name,
+                        'date': datetime.now().strftime('%Y-%m-%d')
+                    }
+
+                    # Save and render concurrently; submission_status() follows the job
+                    pdf_path = None
+                    if str(get_setting("SAVE_GENERATED_INVOICES", "false")).lower() == "true":
+                        os.makedirs('generated_invoices', exist_ok=True)
+                        pdf_path = os.path.join('generated_invoices', pdf_file_name(invoice_data))
+                    st.session_state.submission_job = get_submission_pipeline().submit(invoice_data, save_path=pdf_path)
+                    st.session_state.setdefault('submitted_invoices', set()).add(str(invoice_number))
+                    # Full rerun so the title shows the next invoice number
+                    st.rerun()
+            else:
+                    st.error("Please fill in all required fields and add at least one product")
+            # else:
+            #     st.error("Inovice is FULL! Remove items more than 30 and create a new inovice for it.")
+
+
+    def submission_status():
+        """Latest submission, one line per stage; never waits for a stage to finish"""
+        job = st.session_state.get('submission_job')
+        if job is not None:
+            if not job.pdf_ready():
+                st.info(f"⏳ Rendering invoice #{job.invoice_number} PDF...")
+            else:
+                try:
+                    st.download_button(
+                        label="Download Invoice PDF",
+                        data=job.wait_pdf(),
+                        file_name=pdf_file_name(job.invoice_data),
+                        mime="application/pdf"
+                    )
+                except Exception as e:
+                    st.error(f"Invoice #{job.invoice_number} PDF could not be generated: {e}")
+
+            if not job.saved():
+                st.info(f"⏳ Saving invoice #{job.invoice_number}...")
+            elif job.save_error() is not None:
+                st.error(f"Invoice #{job.invoice_number} could not be saved: {job.save_error()}")
+            else:
+                st.success(f"Invoice #{job.invoice_number} generated successfully!")
+
+        # This session's queued invoices that the backend later rejected for good
+        # (e.g. too large for a sheet cell); the Admin page lists every session's
+        submitted = st.session_state.get('submitted_invoices', ())
+        for failure in get_data_manager().failed_saves():
+            if str(failure['invoice_number']) in submitted:
+                st.error(
+                    f"Invoice #{failure['invoice_number']} was not saved to the invoice store: {failure['error']} "
+                    "Its data is kept; it can be retried from the Admin page."
+                )
+
+
+    @st.fragment(run_every=0.5)
+    @timed("fragment.run", fragment="submission_poll")
+    def poll_submission():
+        """Re-run every half second while the latest submission is in progress"""
+        submission_status()
+        if st.session_state.submission_job.done():
+            # A full rerun draws the final state without this timer
+            st.rerun()
+
+
+    submit_invoice()
+
+    submission_job = st.session_state.get('submission_job')
+    if submission_job is not None and not submission_job.done():
+        poll_submission()
+    else:
+        submission_status()
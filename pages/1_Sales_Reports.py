@@ -0,0 +1,50 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime, timedelta
+from utils.backend import get_sales_analytics
+from utils.page_style import setup_page
+
+setup_page("Sales Reports", page_icon="📊")
+
+st.title("Sales Reports")
+
+analytics = get_sales_analytics()
+with st.spinner("Loading invoice history..."):
+    # Full history is read once per process; after that only new invoices
+    analytics.sync(force=st.button("Refresh"))
+
+today = datetime.now().date()
+date_range = st.date_input("Date range", value=(today - timedelta(days=30), today), key="report_dates")
+if len(date_range) != 2:
+    st.stop()
+start_date, end_date = (d.strftime('%Y-%m-%d') for d in date_range)
+
+summary = analytics.summary(start_date, end_date)
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Revenue", f"Rs. {summary['revenue']:,.2f}")
+col2.metric("Invoices", f"{summary['invoices']:,}")
+col3.metric("Average invoice", f"Rs. {summary['average_invoice']:,.2f}")
+col4.metric("Pieces sold", f"{summary['pieces']:,}")
+
+daily = analytics.daily_revenue(start_date, end_date)
+if not daily:
+    st.info("No invoices in this date range.")
+    st.stop()
+
+st.subheader("Revenue by day")
+st.line_chart(pd.DataFrame(daily).set_index("date")["revenue"])
+
+tabs = st.tabs(["By product", "By customer", "By order booker"])
+for tab, dimension, label in zip(tabs, ("product", "customer", "order_booker"), ("Product", "Customer", "Order Booker")):
+    with tab:
+        rows = analytics.top(dimension, start_date, end_date)
+        table = pd.DataFrame(rows).rename(columns={"name": label, "revenue": "Revenue", "quantity": "Quantity"})
+        st.dataframe(table, hide_index=True, width="stretch")
+
+line_items = pd.DataFrame(analytics.line_items(start_date, end_date))
+st.download_button(
+    label=f"Download {len(line_items):,} line items (CSV)",
+    data=line_items.to_csv(index=False),
+    file_name=f"line_items_{start_date}_{end_date}.csv",
+    mime="text/csv"
+)
@@ -0,0 +1,72 @@
+import streamlit as st
+import pandas as pd
+from utils.backend import get_stock_ledger
+from utils.catalog import get_catalog
+from utils.page_style import setup_page
+
+setup_page("Inventory", page_icon="📦")
+
+st.title("Inventory")
+
+catalog = get_catalog()
+ledger = get_stock_ledger()
+ledger.refresh()
+
+
+@st.fragment
+def stock_receipt():
+    """Record stock received; balances update as soon as it is posted"""
+    st.subheader("Receive Stock")
+    with st.form("stock_receipt", clear_on_submit=True):
+        product_name = st.selectbox("Product", catalog.options[2:])
+        col1, col2 = st.columns(2)
+        with col1:
+            cartons = st.number_input("Cartons", min_value=0, step=1)
+        with col2:
+            pieces = st.number_input("Loose pieces", min_value=0, step=1)
+        note = st.text_input("Note", placeholder="e.g. supplier bill number")
+        if st.form_submit_button("Post Receipt"):
+            product = catalog.by_name[product_name]
+            try:
+                received = ledger.receive(product.sku, cartons=cartons, pieces=pieces, note=note)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.toast(f"Received {received} pieces of {product_name}.")
+                st.rerun()
+
+
+stock_receipt()
+
+st.subheader("Current Stock")
+show_untracked = st.checkbox("Show products never stocked", value=False)
+rows = []
+for product in catalog.products:
+    balance = ledger.balance(product.sku)
+    if balance is None and not show_untracked:
+        continue
+    units = product.units_per_ctn or 1
+    if balance is None:
+        status = "Not stocked"
+    elif balance < 0:
+        status = "Oversold"
+    elif balance < ledger.low_stock_level(product.sku):
+        status = "Low"
+    else:
+        status = "OK"
+    rows.append({
+        "SKU": product.sku,
+        "Product": product.name,
+        "Pieces": balance,
+        "Cartons": None if balance is None else round(balance / units, 1),
+        "Status": status,
+    })
+if rows:
+    st.dataframe(pd.DataFrame(rows), hide_index=True, width="stretch")
+else:
+    st.info("No stock recorded yet. Post a receipt to start tracking a product.")
+
+st.subheader("Recent Movements")
+movements = ledger.movements(limit=50)
+if movements:
+    st.dataframe(pd.DataFrame(movements), hide_index=True, width="stretch")
@@ -0,0 +1,77 @@
+import json
+import streamlit as st
+import pandas as pd
+from utils import instrumentation
+from utils.backend import get_data_manager, get_pdf_cache
+from utils.page_style import setup_page
+
+setup_page("Admin", page_icon="⏱️")
+
+st.title("Admin")
+data_manager = get_data_manager()
+
+st.subheader("Failed saves")
+failures = data_manager.failed_saves()
+if failures:
+    st.caption("Invoices the invoice store rejected for good. Their numbers are already issued: "
+               "retry once the cause is fixed, or dismiss after entering the invoice by hand.")
+    for failure in failures:
+        number = failure['invoice_number']
+        col1, col2, col3 = st.columns([6, 1, 1])
+        with col1:
+            st.error(f"Invoice #{number} ({failure['time']}): {failure['error']}")
+        with col2:
+            if st.button("Retry", key=f"retry_{number}"):
+                data_manager.retry_failed_save(number)
+                st.rerun()
+        with col3:
+            if st.button("Dismiss", key=f"dismiss_{number}"):
+                data_manager.dismiss_failed_save(number)
+                st.rerun()
+else:
+    st.info("No failed saves.")
+
+st.subheader("Timings")
+if not instrumentation.enabled():
+    st.info("Instrumentation is off (INSTRUMENTATION=false).")
+else:
+    st.caption("Durations since the server process started, across all sessions. "
+               "Percentiles cover the most recent samples of each span.")
+
+    records = instrumentation.export_records()
+    if records:
+        table = pd.DataFrame(records)
+        table["labels"] = table["labels"].map(lambda labels: ", ".join(f"{k}={v}" for k, v in labels.items()))
+        st.dataframe(table, hide_index=True, width="stretch")
+    else:
+        st.info("Nothing recorded yet.")
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.download_button(
+            label="Prometheus export",
+            data=instrumentation.export_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain"
+        )
+    with col2:
+        st.download_button(
+            label="JSON export",
+            data="".join(json.dumps(record) + "\n" for record in records),
+            file_name="timings.jsonl",
+            mime="application/json"
+        )
+    with col3:
+        if st.button("Write to log"):
+            instrumentation.log_summary()
+            st.toast("Timings written to the server log.")
+    with col4:
+        if st.button("Reset"):
+            instrumentation.registry.reset()
+            st.rerun()
+
+st.subheader("Caches")
+cache_stats = {"PDF cache": get_pdf_cache().stats()}
+if hasattr(data_manager, "cache_stats"):
+    cache_stats["Invoice cache"] = data_manager.cache_stats()
+st.dataframe(pd.DataFrame(cache_stats).T, width="stretch")
@@ -0,0 +1,260 @@
+"""Incremental sales rollups over stored invoices.
+
+Each invoice's items JSON is parsed once, when the invoice is first seen,
+into a columnar line-item table (NumPy arrays, names stored as integer
+codes). At the same time it is added to daily buckets: revenue, invoice
+count and pieces per day, plus revenue and quantity per day for every
+product, customer and order booker. A date-range query sums only the
+buckets of the days in range, so it costs the same no matter how much
+history is stored.
+
+New invoices arrive through the store's save listener (see
+InvoiceStore.add_save_listener); sync() picks up invoices saved by other
+processes. Issued invoices are not edited, so an invoice number that has
+already been counted is never counted again.
+"""
+import bisect
+from datetime import date
+import numpy as np
+from utils.invoice_history import InvoiceHistory
+from utils.storage import decode_items
+
+DIMENSIONS = ("product", "customer", "order_booker")
+
+
+def _day(value):
+    """Day ordinal of a YYYY-MM-DD value, or None if it is not a date"""
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return date.fromisoformat(str(value).strip()[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _paisa(value):
+    try:
+        return int(round(float(value) * 100))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class LineItemTable:
+    """Append-only columnar table; columns are NumPy arrays grown by doubling"""
+
+    COLUMNS = {
+        "invoice_number": np.int64,
+        "day": np.int32,
+        "product": np.int32,
+        "customer": np.int32,
+        "order_booker": np.int32,
+        "quantity": np.int64,
+        "total_paisa": np.int64,
+    }
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in self.COLUMNS.items()}
+
+    def extend(self, rows):
+        """rows maps each column name to an equal-length list"""
+        count = len(rows["day"])
+        needed = self.size + count
+        capacity = len(self.columns["day"])
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            for name, column in self.columns.items():
+                grown = np.zeros(capacity, column.dtype)
+                grown[:self.size] = column[:self.size]
+                self.columns[name] = grown
+        for name, values in rows.items():
+            self.columns[name][self.size:needed] = values
+        self.size = needed
+
+    def select(self, first_day, last_day):
+        """Columns of the rows dated first_day..last_day inclusive"""
+        day = self.columns["day"][:self.size]
+        mask = (day >= first_day) & (day <= last_day)
+        return {name: column[:self.size][mask] for name, column in self.columns.items()}
+
+
+class SalesAnalytics(InvoiceHistory):
+    """Revenue by day, product, customer and order booker, kept up to date incrementally"""
+
+    def __init__(self, data_manager, sync_interval=60):
+        super().__init__(data_manager, sync_interval)
+        self.lines = LineItemTable()
+        self.names = {dimension: [] for dimension in DIMENSIONS}
+        self._codes = {dimension: {} for dimension in DIMENSIONS}
+        self.daily = {}     # day -> [revenue_paisa, invoices, pieces]
+        self.by_day = {dimension: {} for dimension in DIMENSIONS}   # day -> {code: [revenue_paisa, quantity]}
+        self.days = []      # sorted days that have buckets
+        self.seen = set()
+        self.undated = 0
+
+    def _code(self, dimension, name):
+        name = str(name or "").strip()
+        codes = self._codes[dimension]
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(self.names[dimension])
+            self.names[dimension].append(name)
+        return code
+
+    def _merge(self, dimension, days, codes, revenue, quantity):
+        """Add per-row amounts into the (day, code) buckets, aggregating with NumPy first"""
+        width = len(self.names[dimension]) + 1
+        keys, inverse = np.unique(days * width + codes, return_inverse=True)
+        revenue = np.rint(np.bincount(inverse, weights=revenue)).astype(np.int64)
+        quantity = np.rint(np.bincount(inverse, weights=quantity)).astype(np.int64)
+        by_day = self.by_day[dimension]
+        for key, key_revenue, key_quantity in zip(keys.tolist(), revenue.tolist(), quantity.tolist()):
+            day, code = divmod(key, width)
+            buckets = by_day.setdefault(day, {})
+            bucket = buckets.get(code)
+            if bucket is None:
+                buckets[code] = [key_revenue, key_quantity]
+            else:
+                bucket[0] += key_revenue
+                bucket[1] += key_quantity
+
+    def add_invoices(self, invoices):
+        """Count invoices not seen before; usable directly as a save listener"""
+        rows = {name: [] for name in LineItemTable.COLUMNS}
+        # One entry per invoice: day, customer, order booker, revenue, pieces
+        days, customers, bookers, revenues, pieces = [], [], [], [], []
+        with self._lock:
+            for invoice in invoices:
+                number = str(invoice.get("invoice_number", "")).strip()
+                if not number or number in self.seen:
+                    continue
+                self.seen.add(number)
+                day = _day(invoice.get("date"))
+                if day is None:
+                    self.undated += 1
+                    continue
+                customer = self._code("customer", invoice.get("customer_name"))
+                booker = self._code("order_booker", invoice.get("order_booker_name"))
+                items = decode_items(invoice.get("items")) or []
+                if not isinstance(items, list):
+                    items = []
+                invoice_number = _int(number)
+                invoice_pieces = 0
+                for item in items:
+                    quantity = _int(item.get("quantity"))
+                    invoice_pieces += quantity
+                    rows["invoice_number"].append(invoice_number)
+                    rows["day"].append(day)
+                    rows["product"].append(self._code("product", item.get("product_name")))
+                    rows["customer"].append(customer)
+                    rows["order_booker"].append(booker)
+                    rows["quantity"].append(quantity)
+                    rows["total_paisa"].append(_paisa(item.get("total_price")))
+                days.append(day)
+                customers.append(customer)
+                bookers.append(booker)
+                revenues.append(_paisa(invoice.get("total_amount")))
+                pieces.append(invoice_pieces)
+            if not days:
+                return
+
+            for day, revenue, invoice_pieces in zip(days, revenues, pieces):
+                totals = self.daily.get(day)
+                if totals is None:
+                    totals = self.daily[day] = [0, 0, 0]
+                    bisect.insort(self.days, day)
+                totals[0] += revenue
+                totals[1] += 1
+                totals[2] += invoice_pieces
+
+            days = np.array(days, dtype=np.int64)
+            revenues = np.array(revenues, dtype=np.float64)
+            pieces = np.array(pieces, dtype=np.float64)
+            self._merge("customer", days, np.array(customers, dtype=np.int64), revenues, pieces)
+            self._merge("order_booker", days, np.array(bookers, dtype=np.int64), revenues, pieces)
+            if rows["day"]:
+                self._merge(
+                    "product",
+                    np.array(rows["day"], dtype=np.int64),
+                    np.array(rows["product"], dtype=np.int64),
+                    np.array(rows["total_paisa"], dtype=np.float64),
+                    np.array(rows["quantity"], dtype=np.float64),
+                )
+                self.lines.extend(rows)
+
+    def _has_invoice(self, number):
+        return str(number).strip() in self.seen
+
+    def _days_between(self, start_date, end_date):
+        first, last = _day(start_date), _day(end_date)
+        return self.days[bisect.bisect_left(self.days, first):bisect.bisect_right(self.days, last)]
+
+    def summary(self, start_date, end_date):
+        with self._lock:
+            revenue = invoices = pieces = 0
+            for day in self._days_between(start_date, end_date):
+                day_revenue, day_invoices, day_pieces = self.daily[day]
+                revenue += day_revenue
+                invoices += day_invoices
+                pieces += day_pieces
+        return {
+            "revenue": revenue / 100,
+            "invoices": invoices,
+            "pieces": pieces,
+            "average_invoice": revenue / 100 / invoices if invoices else 0.0,
+        }
+
+    def daily_revenue(self, start_date, end_date):
+        """[{date, revenue, invoices, pieces}] for every day in range that has sales"""
+        with self._lock:
+            return [
+                {
+                    "date": date.fromordinal(day).isoformat(),
+                    "revenue": self.daily[day][0] / 100,
+                    "invoices": self.daily[day][1],
+                    "pieces": self.daily[day][2],
+                }
+                for day in self._days_between(start_date, end_date)
+            ]
+
+    def top(self, dimension, start_date, end_date, limit=None):
+        """[{name, revenue, quantity}] for one dimension, highest revenue first"""
+        with self._lock:
+            totals = {}
+            for day in self._days_between(start_date, end_date):
+                for code, (revenue, quantity) in self.by_day[dimension].get(day, {}).items():
+                    total = totals.get(code)
+                    if total is None:
+                        totals[code] = [revenue, quantity]
+                    else:
+                        total[0] += revenue
+                        total[1] += quantity
+            names = self.names[dimension]
+        ranked = sorted(totals.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [
+            {"name": names[code], "revenue": revenue / 100, "quantity": quantity}
+            for code, (revenue, quantity) in ranked[:limit]
+        ]
+
+    def line_items(self, start_date, end_date):
+        """Line items dated in range, as plain columns with names decoded"""
+        with self._lock:
+            selected = self.lines.select(_day(start_date), _day(end_date))
+            names = {dimension: np.array(self.names[dimension] or [""], dtype=object) for dimension in DIMENSIONS}
+        return {
+            "invoice_number": selected["invoice_number"],
+            "date": [date.fromordinal(int(day)).isoformat() for day in selected["day"]],
+            "product": names["product"][selected["product"]],
+            "customer": names["customer"][selected["customer"]],
+            "order_booker": names["order_booker"][selected["order_booker"]],
+            "quantity": selected["quantity"],
+            "total_price": selected["total_paisa"] / 100,
+        }
@@ -0,0 +1,129 @@
+"""Process-wide singletons shared by every session: storage backend, PDF cache, renderer.
+
+Each one is built on first use rather than at import, so the page starts
+rendering before credentials are parsed, the spreadsheet is opened or
+ReportLab is imported. Later sessions in the same process reuse them.
+"""
+import threading
+from utils.instrumentation import span
+from utils.storage import create_data_manager, get_setting, store_identity
+
+_instances = {}
+_lock = threading.RLock()
+
+
+def _singleton(name, factory):
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = _instances[name] = factory()
+    return instance
+
+
+def get_data_manager():
+    return _singleton("data_manager", create_data_manager)
+
+
+def _create_pdf_cache():
+    from utils.invoice_generator import TEMPLATE_VERSION
+    from utils.pdf_cache import RenderedPdfCache
+
+    return RenderedPdfCache(
+        TEMPLATE_VERSION,
+        max_entries=int(get_setting("PDF_CACHE_ENTRIES", 128)),
+        disk_dir=get_setting("PDF_CACHE_DIR"),
+        disk_max_bytes=int(get_setting("PDF_CACHE_MAX_MB", 200)) * 1024 * 1024,
+    )
+
+
+def get_pdf_cache():
+    return _singleton("pdf_cache", _create_pdf_cache)
+
+
+def _create_invoice_generator():
+    from utils.invoice_generator import InvoiceGenerator
+
+    return InvoiceGenerator()
+
+
+def get_invoice_generator():
+    return _singleton("invoice_generator", _create_invoice_generator)
+
+
+def render_invoice_pdf(invoice_data, save_path=None):
+    """PDF bytes for an invoice, served from the PDF cache when possible"""
+    # Includes cache hits; pdf.render times the ReportLab builds alone
+    with span("pdf.get_or_render"):
+        return get_pdf_cache().get_or_render(
+            invoice_data,
+            lambda invoice: get_invoice_generator().generate_invoice_bytes(invoice, save_path=save_path)
+        )
+
+
+def _create_submission_pipeline():
+    from utils.submission_pipeline import SubmissionPipeline
+
+    return SubmissionPipeline(get_data_manager(), render_invoice_pdf)
+
+
+def get_submission_pipeline():
+    return _singleton("submission_pipeline", _create_submission_pipeline)
+
+
+def _create_sales_analytics():
+    from utils.analytics import SalesAnalytics
+
+    data_manager = get_data_manager()
+    analytics = SalesAnalytics(data_manager)
+    data_manager.add_save_listener(analytics.add_invoices)
+    return analytics
+
+
+def get_sales_analytics():
+    return _singleton("sales_analytics", _create_sales_analytics)
+
+
+def _create_customer_registry():
+    from utils.customers import CustomerRegistry
+
+    data_manager = get_data_manager()
+    registry = CustomerRegistry(data_manager)
+    data_manager.add_save_listener(registry.add_invoices)
+    return registry
+
+
+def get_customer_registry():
+    return _singleton("customer_registry", _create_customer_registry)
+
+
+def _create_stock_ledger():
+    from utils.catalog import get_catalog
+    from utils.inventory import StockLedger
+
+    ledger = StockLedger(
+        get_catalog,
+        ledger_path=get_setting("INVENTORY_LEDGER_PATH", "data/stock_ledger.jsonl"),
+        low_stock_cartons=int(get_setting("LOW_STOCK_CARTONS", 2)),
+        store=store_identity(),
+    )
+    get_data_manager().add_save_listener(ledger.post_invoices)
+    return ledger
+
+
+def get_stock_ledger():
+    return _singleton("stock_ledger", _create_stock_ledger)
+
+
+def _create_invoice_search():
+    from utils.invoice_search import InvoiceSearch
+
+    data_manager = get_data_manager()
+    search = InvoiceSearch(data_manager)
+    data_manager.add_save_listener(search.add_invoices)
+    return search
+
+
+def get_invoice_search():
+    return _singleton("invoice_search", _create_invoice_search)
@@ -0,0 +1,159 @@
+"""Export many invoice PDFs at once, as a ZIP or one merged PDF.
+
+    python -m utils.batch_export --from 1050 --to 1200 --out invoices.zip
+    python -m utils.batch_export --start-date 2026-01-01 --end-date 2026-01-31 --format pdf --out january.pdf
+
+Records are fetched with one bulk read and rendered in parallel in a
+process pool. A failing invoice is reported and skipped; it does not stop
+the rest of the export.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils.storage import INVOICE_COLUMNS
+
+# Below this many invoices, starting worker processes costs more than it saves
+MIN_PARALLEL_INVOICES = 8
+
+_generator = None
+
+
+def _init_worker():
+    global _generator
+    from utils.invoice_generator import InvoiceGenerator
+
+    _generator = InvoiceGenerator()
+
+
+def _render(invoice):
+    """Render one invoice; returns (pdf_bytes, error) instead of raising"""
+    if _generator is None:
+        _init_worker()
+    try:
+        return _generator.generate_invoice_bytes(invoice), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def pdf_file_name(invoice):
+    safe_customer_name = "".join(x for x in str(invoice.get('customer_name', '')) if x.isalnum() or x.isspace()).strip()
+    return f"{safe_customer_name}_{invoice.get('invoice_number')}.pdf"
+
+
+def fetch_invoices(data_manager, first_number=None, last_number=None, start_date=None, end_date=None):
+    """One bulk read of complete records, by number range or by date range"""
+    if first_number is not None and last_number is not None:
+        invoices = data_manager.get_invoices_in_range(first_number, last_number, INVOICE_COLUMNS)
+    elif start_date and end_date:
+        invoices = data_manager.get_invoices_between(start_date, end_date, INVOICE_COLUMNS)
+    else:
+        raise ValueError("Give either an invoice number range or a date range")
+    # Plain dicts, so they can be sent to worker processes
+    return [dict(invoice) for invoice in invoices]
+
+
+def render_invoices(invoices, workers=None, progress=None):
+    """Render every invoice; returns [(invoice, pdf_bytes, error)] in input order"""
+    results = [None] * len(invoices)
+    done = 0
+    if workers == 1 or len(invoices) < MIN_PARALLEL_INVOICES:
+        for position, invoice in enumerate(invoices):
+            results[position] = (invoice, *_render(invoice))
+            done += 1
+            if progress:
+                progress(done, len(invoices))
+        return results
+
+    # spawn rather than fork: the Streamlit server process is multi-threaded
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+        futures = {executor.submit(_render, invoice): position for position, invoice in enumerate(invoices)}
+        for future in as_completed(futures):
+            position = futures[future]
+            try:
+                pdf_bytes, error = future.result()
+            except Exception as e:  # the worker itself died
+                pdf_bytes, error = None, f"{type(e).__name__}: {e}"
+            results[position] = (invoices[position], pdf_bytes, error)
+            done += 1
+            if progress:
+                progress(done, len(invoices))
+    return results
+
+
+def build_zip(results):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for invoice, pdf_bytes, error in results:
+            if pdf_bytes is not None:
+                archive.writestr(pdf_file_name(invoice), pdf_bytes)
+        errors = [f"{invoice.get('invoice_number')}: {error}" for invoice, _, error in results if error]
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors) + "\n")
+    return buffer.getvalue()
+
+
+def build_merged_pdf(results):
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _, pdf_bytes, _ in results:
+        if pdf_bytes is not None:
+            writer.append(io.BytesIO(pdf_bytes))
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def export_invoices(data_manager, first_number=None, last_number=None, start_date=None, end_date=None,
+                    output_format="zip", workers=None, progress=None):
+    """Returns (output_bytes, exported_count, errors) where errors is [(invoice_number, message)]"""
+    invoices = fetch_invoices(data_manager, first_number, last_number, start_date, end_date)
+    results = render_invoices(invoices, workers=workers, progress=progress)
+    errors = [(invoice.get('invoice_number'), error) for invoice, _, error in results if error]
+    exported = len(results) - len(errors)
+    if output_format == "pdf":
+        return build_merged_pdf(results), exported, errors
+    return build_zip(results), exported, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="first_number", type=int)
+    parser.add_argument("--to", dest="last_number", type=int)
+    parser.add_argument("--start-date")
+    parser.add_argument("--end-date")
+    parser.add_argument("--format", choices=["zip", "pdf"], default="zip")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    from utils.storage import create_data_manager
+
+    def progress(done, total):
+        print(f"\rRendered {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    output, exported, errors = export_invoices(
+        create_data_manager(),
+        first_number=args.first_number,
+        last_number=args.last_number,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        output_format=args.format,
+        workers=args.workers,
+        progress=progress,
+    )
+    print(file=sys.stderr)
+    with open(args.out, "wb") as f:
+        f.write(output)
+    print(f"Exported {exported} invoices to {args.out}")
+    for number, error in errors:
+        print(f"  invoice {number} failed: {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
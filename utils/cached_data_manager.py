@@ -0,0 +1,98 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from utils.storage import StoreWrapper
+
+
+class LRUCache:
+    """Bounded LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, maxsize=512, ttl=15 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedDataManager(StoreWrapper):
+    """Write-through cache in front of an invoice backend.
+
+    Exposes the same methods as the backend it wraps, so main.py does not
+    need to know whether it talks to the cache or the backend directly.
+    """
+
+    def __init__(self, backend, maxsize=512, ttl=15 * 60):
+        super().__init__(backend)
+        self.invoices = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(invoice_number):
+        return str(invoice_number).strip()
+
+    def save_invoice(self, invoice_data):
+        self.save_invoices([invoice_data])
+
+    def save_invoices(self, invoices):
+        keys = [self._key(invoice_data.get("invoice_number")) for invoice_data in invoices]
+        for key in keys:
+            self.invoices.invalidate(key)
+        self.backend.save_invoices(invoices)
+        for key, invoice_data in zip(keys, invoices):
+            self.invoices.put(key, copy.deepcopy(invoice_data))
+        self._notify_saved(invoices)
+
+    def get_invoice_by_number(self, invoice_number):
+        key = self._key(invoice_number)
+        record = self.invoices.get(key)
+        if record is None:
+            record = self.backend.get_invoice_by_number(invoice_number)
+            if record is None:
+                return None
+            self.invoices.put(key, record)
+        # Callers get their own copy so they cannot modify the cached record
+        return copy.deepcopy(record)
+
+    def cache_stats(self):
+        return self.invoices.stats()
@@ -0,0 +1,50 @@
+import json
+import os
+from collections import namedtuple
+import streamlit as st
+from utils.search_index import SearchIndex
+
+CATALOG_PATH = "data/products.json"
+
+Product = namedtuple("Product", ["sku", "name", "rate", "units_per_ctn"])
+
+
+class Catalog:
+    """Products loaded from the catalog file, with lookups derived from one record per SKU"""
+
+    def __init__(self, version, products):
+        self.version = version
+        self.products = products
+        self.by_sku = {p.sku: p for p in products}
+        self.by_name = {p.name: p for p in products}
+        # Shapes main.py used to keep by hand; "" is the empty selection
+        self.options = ["", "Other"] + [p.name for p in products]
+        self.rates = {"": 0, **{p.name: p.rate for p in products}}
+        self.units_per_ctn = {"": 0, **{p.name: p.units_per_ctn for p in products}}
+        self.index = SearchIndex()
+        for p in products:
+            self.index.add(p.name, f"{p.name} {p.sku}")
+
+    def search(self, query, limit=20):
+        """Product names matching query by word prefix, or fuzzily if nothing matches"""
+        return self.index.search(query, limit=limit)
+
+
+def load_catalog(path=CATALOG_PATH):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    products = [
+        Product(p["sku"], p["name"], p["rate"], p["units_per_ctn"])
+        for p in data["products"]
+    ]
+    return Catalog(data.get("version", 1), products)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _cached_catalog(path, mtime):
+    return load_catalog(path)
+
+
+def get_catalog(path=CATALOG_PATH):
+    """Catalog shared across sessions and reruns; reloaded when the file changes"""
+    return _cached_catalog(path, os.path.getmtime(path))
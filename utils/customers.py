@@ -0,0 +1,75 @@
+from utils.invoice_history import InvoiceHistory
+from utils.search_index import SearchIndex, normalize
+
+
+class Customer:
+    """One shop as it appears across invoices; name and address are the latest used"""
+
+    def __init__(self, name, address):
+        self.name = name
+        self.address = address
+        self.invoice_numbers = []
+        self.last_date = ""
+
+    def __repr__(self):
+        return f"Customer({self.name!r}, {len(self.invoice_numbers)} invoices)"
+
+
+class CustomerRegistry(InvoiceHistory):
+    """Customers built from historical invoices, for autocomplete and address autofill.
+
+    Invoices are read once (without their items); later invoices arrive
+    through the store's save listener, and those saved by other processes
+    through a sync that a lookup starts in the background, so lookups and
+    searches never wait for the invoice store. Spellings that normalize the
+    same ("Ali Traders", "ALI TRADERS.") are one customer.
+    """
+
+    COLUMNS = ["invoice_number", "customer_name", "customer_address", "date"]
+
+    def __init__(self, data_manager, sync_interval=60):
+        super().__init__(data_manager, sync_interval)
+        self.customers = {}     # normalized name -> Customer
+        self.index = SearchIndex()
+        self.seen = set()
+
+    def add_invoices(self, invoices):
+        """Record the customers of newly saved invoices; usable as a save listener"""
+        with self._lock:
+            for invoice in invoices:
+                number = str(invoice.get("invoice_number", "")).strip()
+                if number in self.seen:
+                    continue
+                self.seen.add(number)
+                name = str(invoice.get("customer_name") or "").strip()
+                key = normalize(name)
+                if not key:
+                    continue
+                address = str(invoice.get("customer_address") or "").strip()
+                customer = self.customers.get(key)
+                if customer is None:
+                    customer = self.customers[key] = Customer(name, address)
+                    self.index.add(key, f"{name} {address}")
+                invoice_date = str(invoice.get("date") or "")
+                if invoice_date >= customer.last_date:
+                    # Latest invoice wins, so a corrected address sticks
+                    customer.name = name
+                    customer.address = address or customer.address
+                    customer.last_date = invoice_date
+                customer.invoice_numbers.append(invoice.get("invoice_number"))
+
+    def _has_invoice(self, number):
+        return str(number).strip() in self.seen
+
+    def search(self, query, limit=10):
+        """Customer names matching query by word prefix, or fuzzily if nothing matches"""
+        self.load()
+        self.sync_in_background()
+        with self._lock:
+            return [self.customers[key].name for key in self.index.search(query, limit=limit)]
+
+    def get(self, name):
+        self.load()
+        self.sync_in_background()
+        with self._lock:
+            return self.customers.get(normalize(name))
@@ -1,43 +1,279 @@
-import pandas as pd
+import csv
+import io
 import json
-from pathlib import Path
 import os
+import threading
+from utils.file_lock import locked
+from utils.storage import INVOICE_COLUMNS, InvoiceRecord, InvoiceStore, decode_items
 
-class DataManager:
-    def __init__(self):
-        self.invoices_file = "data/invoices.csv"
+
+def _convert(column, value):
+    if column == "invoice_number":
+        return int(value) if str(value).strip().isdigit() else value
+    if column == "total_amount":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return value
+    if column == "items":
+        return decode_items(value)
+    return value
+
+
+class DataManager(InvoiceStore):
+    """Invoice store backed by an append-only CSV file.
+
+    Saves append one row under a file lock. A sidecar index
+    (<csv>.idx, one "invoice_number offset end" line per row) gives the byte
+    range of every invoice, so lookups read a single row and numbering never
+    re-reads the CSV. Rows appended by other processes are picked up by
+    indexing only the bytes past the end of the last indexed row.
+    """
+
+    def __init__(self, invoices_file="data/invoices.csv", start=1050):
+        self.invoices_file = invoices_file
+        self.index_file = invoices_file + ".idx"
+        self.counter_file = invoices_file + ".counter"
+        self.lock_file = invoices_file + ".lock"
+        self.start = start
+        self._lock = threading.Lock()
+        self._offsets = {}
+        self._indexed_size = 0
+        self._index_position = 0
         self._initialize_storage()
 
     def _initialize_storage(self):
         """Initialize storage files if they don't exist"""
-        os.makedirs("data", exist_ok=True)
+        os.makedirs(os.path.dirname(self.invoices_file) or ".", exist_ok=True)
+
+        with self._locked():
+            if not os.path.exists(self.invoices_file):
+                with open(self.invoices_file, "w", newline="", encoding="utf-8") as f:
+                    csv.writer(f, lineterminator="\n").writerow(INVOICE_COLUMNS)
+                for path in (self.index_file, self.counter_file):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self._upgrade_header()
+            self.headers = self._read_header()
+            self._load_index()
+
+    def _locked(self):
+        return locked(self._lock, self.lock_file)
+
+    def _read_header(self):
+        with open(self.invoices_file, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), [])
+
+    def _upgrade_header(self):
+        """One-off rewrite of files created before order_booker_name existed"""
+        headers = self._read_header()
+        missing = [c for c in INVOICE_COLUMNS if c not in headers]
+        if not missing:
+            return
+        import pandas as pd
+
+        df = pd.read_csv(self.invoices_file, dtype=str, keep_default_na=False)
+        for column in missing:
+            df[column] = ""
+        df.to_csv(self.invoices_file, index=False)
+        if os.path.exists(self.index_file):
+            os.remove(self.index_file)
+
+    def _load_index(self):
+        self._offsets = {}
+        self._indexed_size = 0
+        self._index_position = 0
+        self._read_index_tail()
+        if self._indexed_size > os.path.getsize(self.invoices_file):
+            # The CSV was replaced or truncated; index it from scratch
+            self._offsets = {}
+            self._indexed_size = 0
+            self._index_position = 0
+            open(self.index_file, "w").close()
+        self._catch_up()
+
+    def _read_index_tail(self):
+        """Pick up index lines written since we last looked (possibly by another process)"""
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, "rb") as f:
+            f.seek(self._index_position)
+            for line in f:
+                parts = line.split()
+                if len(parts) != 3 or not line.endswith(b"\n"):
+                    break  # torn write; the CSV scan below covers that row
+                number, offset, end = parts[0].decode(), int(parts[1]), int(parts[2])
+                self._offsets[number] = (offset, end)
+                self._indexed_size = max(self._indexed_size, end)
+                self._index_position += len(line)
+
+    def _catch_up(self):
+        """Index rows appended after the last indexed byte"""
+        self._read_index_tail()
+        size = os.path.getsize(self.invoices_file)
+        if size <= self._indexed_size:
+            return
+        entries = []
+        with open(self.invoices_file, "rb") as f:
+            f.seek(self._indexed_size)
+            line_offsets = []
+
+            def lines():
+                while True:
+                    position = f.tell()
+                    line = f.readline()
+                    if not line:
+                        return
+                    line_offsets.append(position)
+                    yield line.decode("utf-8")
+
+            reader = csv.reader(lines())
+            consumed = 0
+            for row in reader:
+                offset, end = line_offsets[consumed], f.tell()
+                consumed = reader.line_num
+                if offset == 0 or not row:
+                    continue  # header or blank line
+                entries.append((row[self.headers.index("invoice_number")].strip(), offset, end))
+            self._indexed_size = f.tell()
+        self._append_index(entries)
 
-        if not os.path.exists(self.invoices_file):
-            pd.DataFrame(columns=[
-                'invoice_number', 'customer_name', 'customer_address',
-                'sender_name', 'items', 'total_amount', 'date'
-            ]).to_csv(self.invoices_file, index=False)
+    def _append_index(self, entries):
+        if not entries:
+            return
+        data = "".join(f"{number} {offset} {end}\n" for number, offset, end in entries).encode("utf-8")
+        with open(self.index_file, "ab") as f:
+            f.write(data)
+        self._index_position += len(data)
+        for number, offset, end in entries:
+            self._offsets[number] = (offset, end)
+
+    def _max_invoice_number(self):
+        numbers = [int(n) for n in self._offsets if n.isdigit()]
+        return max(numbers) if numbers else None
+
+    def _last_claimed(self):
+        last = None
+        if os.path.exists(self.counter_file):
+            with open(self.counter_file, encoding="utf-8") as f:
+                value = f.read().strip()
+            if value.isdigit():
+                last = int(value)
+        highest = self._max_invoice_number()
+        if highest is not None and (last is None or highest > last):
+            last = highest
+        return last if last is not None else self.start - 1
 
     def get_next_invoice_number(self):
         """Generate the next sequential invoice number"""
-        # try:
-        df = pd.read_csv(self.invoices_file)
-        if df.empty:
-            return "1"
-        else:
-            return df['invoice_number'].shape[0] + 1
+        with self._locked():
+            self._catch_up()
+            return self._last_claimed() + 1
+
+    def claim_next_invoice_number(self):
+        with self._locked():
+            self._catch_up()
+            number = self._last_claimed() + 1
+            with open(self.counter_file, "w", encoding="utf-8") as f:
+                f.write(str(number))
+            return number
 
     def save_invoice(self, invoice_data: dict):
         """Save generated invoice"""
-        df = pd.read_csv(self.invoices_file)
-        # Convert items list to string for storage
-        invoice_data['items'] = json.dumps(invoice_data['items'])
-        new_row = pd.DataFrame([invoice_data])
-        df = pd.concat([df, new_row], ignore_index=True)
-        df.to_csv(self.invoices_file, index=False)
+        self.save_invoices([invoice_data])
+
+    def save_invoices(self, invoices):
+        if not invoices:
+            return
+        with self._locked():
+            self._catch_up()
+            with open(self.invoices_file, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                entries = []
+                chunks = []
+                for invoice_data in invoices:
+                    # Convert items list to string for storage
+                    invoice_data = dict(invoice_data)
+                    if not isinstance(invoice_data.get("items"), str):
+                        invoice_data["items"] = json.dumps(invoice_data["items"])
+                    buffer = io.StringIO()
+                    csv.writer(buffer, lineterminator="\n").writerow(
+                        [invoice_data.get(h, "") for h in self.headers]
+                    )
+                    chunk = buffer.getvalue().encode("utf-8")
+                    chunks.append(chunk)
+                    entries.append((str(invoice_data["invoice_number"]).strip(), offset, offset + len(chunk)))
+                    offset += len(chunk)
+                f.write(b"".join(chunks))
+                f.flush()
+                os.fsync(f.fileno())
+            self._indexed_size = offset
+            self._append_index(entries)
+        self._notify_saved(invoices)
+
+    def _read_row(self, offset, end):
+        with open(self.invoices_file, "rb") as f:
+            f.seek(offset)
+            data = f.read(end - offset).decode("utf-8")
+        row = next(csv.reader(io.StringIO(data, newline="")))
+        row += [""] * (len(self.headers) - len(row))
+        return {h: _convert(h, v) for h, v in zip(self.headers, row)}
+
+    def get_invoice_by_number(self, invoice_number):
+        key = str(invoice_number).strip()
+        with self._locked():
+            if key not in self._offsets:
+                self._catch_up()
+            position = self._offsets.get(key)
+        if position is None:
+            return None
+        return self._read_row(*position)
+
+    def get_invoice_numbers(self):
+        with self._locked():
+            self._catch_up()
+            return sorted(int(n) for n in self._offsets if n.isdigit())
+
+    def _iter_rows(self, columns):
+        columns = list(columns or [c for c in self.headers if c != "items"])
+        with open(self.invoices_file, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield InvoiceRecord({c: _convert(c, row.get(c, "")) for c in columns}, self)
+
+    def get_records(self, columns=None):
+        return list(self._iter_rows(columns))
+
+    def get_invoices_between(self, start_date, end_date, columns=None):
+        columns = list(columns or [c for c in self.headers if c != "items"])
+        records = self._iter_rows(set(columns) | {"date"})
+        return [
+            InvoiceRecord({c: r[c] for c in columns}, self)
+            for r in records if str(start_date) <= str(r["date"]) <= str(end_date)
+        ]
+
+    def get_invoices_in_range(self, first_number, last_number, columns=None):
+        columns = list(columns or [c for c in self.headers if c != "items"])
+        with self._locked():
+            self._catch_up()
+            positions = sorted(
+                (int(number), position) for number, position in self._offsets.items()
+                if number.isdigit() and int(first_number) <= int(number) <= int(last_number)
+            )
+        records = []
+        for _, position in positions:
+            row = self._read_row(*position)
+            records.append(InvoiceRecord({c: row.get(c, "") for c in columns}, self))
+        return records
+
+    def load_items(self, records):
+        for record in records:
+            if "items" not in record:
+                invoice = self.get_invoice_by_number(record["invoice_number"])
+                dict.__setitem__(record, "items", invoice["items"] if invoice else [])
+        return records
 
     def get_invoices(self):
         """Get all invoices"""
-        return pd.read_csv(self.invoices_file)
+        import pandas as pd
 
-# ob = DataManager()
+        return pd.read_csv(self.invoices_file)
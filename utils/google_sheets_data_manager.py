@@ -1,56 +1,256 @@
-import streamlit as st
+import re
+import threading
 import gspread
 import json
-from google.oauth2.service_account import Credentials
-
-class GoogleSheetsDataManager:
-    def __init__(self, sheet_name, worksheet_name="Sheet1"):
-        # Load credentials from Streamlit secrets
-
-        creds = st.secrets["GOOGLE_SHEETS_CREDS"]
-        if isinstance(creds, str):
-            creds_dict = json.loads(creds)  # Cloud: JSON string
-        else:
-            creds_dict = dict(creds)   # Local: TOML table
-
-        creds = Credentials.from_service_account_info(
-            creds_dict,
-            scopes=[
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive"
-            ]
+from gspread.utils import numericise, rowcol_to_a1
+from utils.invoice_counter import InvoiceCounter
+from utils.sheets_client import get_sheets_client
+from utils.storage import InvoiceRecord, InvoiceStore, decode_items
+
+
+def _column_letter(col):
+    return re.sub(r"\d", "", rowcol_to_a1(1, col))
+
+
+class GoogleSheetsDataManager(InvoiceStore):
+    def __init__(self, sheet_name, worksheet_name="Sheet1", counter_worksheet_name="meta", client=None, spreadsheet=None):
+        # Nothing is opened here; the spreadsheet is opened on first use.
+        # client is a SheetsClient (default: the shared one); spreadsheet may
+        # be passed in, e.g. a fake in benchmarks.
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
+        self.counter_worksheet_name = counter_worksheet_name
+        self._client = client
+        self._spreadsheet = spreadsheet
+        self._opened = False
+        self._sheet = None
+        self._open_lock = threading.Lock()
+        self._counter = None
+
+        # invoice_number -> sheet row, filled lazily from the invoice_number column only
+        self._headers = None
+        self._row_index = None
+        self._last_indexed_row = 1
+        self._index_lock = threading.Lock()
+
+    @property
+    def spreadsheet(self):
+        if not self._opened:
+            with self._open_lock:
+                if not self._opened:
+                    # Every request goes through the SheetsClient (quota, retries, single-flight)
+                    client = self._client or get_sheets_client()
+                    if self._spreadsheet is None:
+                        self._spreadsheet = client.open(self.sheet_name)
+                    else:
+                        self._spreadsheet = client.wrap(self._spreadsheet)
+                    self._opened = True
+        return self._spreadsheet
+
+    @property
+    def sheet(self):
+        if self._sheet is None:
+            self._sheet = self.spreadsheet.worksheet(self.worksheet_name)
+        return self._sheet
+
+    def _get_headers(self):
+        if self._headers is None:
+            self._headers = self.sheet.row_values(1)
+        return self._headers
+
+    def _column_range(self, column, start_row, end_row=None):
+        letter = _column_letter(self._get_headers().index(column) + 1)
+        return f"{letter}{start_row}:{letter}{end_row or ''}"
+
+    def _refresh_index(self, rebuild=False):
+        """Index rows appended since the last refresh (or all rows on rebuild)"""
+        with self._index_lock:
+            if rebuild or self._row_index is None:
+                self._row_index = {}
+                self._last_indexed_row = 1
+            start = self._last_indexed_row + 1
+            values = self.sheet.get(self._column_range("invoice_number", start))
+            for offset, cells in enumerate(values):
+                if cells and str(cells[0]).strip():
+                    self._row_index[str(cells[0]).strip()] = start + offset
+            self._last_indexed_row = start + len(values) - 1
+
+    def _index_appended_rows(self, response, invoice_numbers):
+        """Record the rows an append landed on, parsed from the API response"""
+        if self._row_index is None:
+            return
+        updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+        match = re.search(r"![A-Z]+(\d+)", updated_range)
+        if not match:
+            return
+        first_row = int(match.group(1))
+        with self._index_lock:
+            for offset, invoice_number in enumerate(invoice_numbers):
+                self._row_index[str(invoice_number).strip()] = first_row + offset
+            if first_row == self._last_indexed_row + 1:
+                self._last_indexed_row = first_row + len(invoice_numbers) - 1
+
+    def _read_row(self, row):
+        headers = self._get_headers()
+        values = self.sheet.row_values(row)
+        values += [""] * (len(headers) - len(values))
+        record = {}
+        for header, value in zip(headers, values):
+            record[header] = value if header == "items" else numericise(value)
+        return record
+
+    def _records_from_columns(self, columns, column_values, rows):
+        """Zip per-column value ranges (as returned by batch_get) into records"""
+        records = []
+        for position, row in enumerate(rows):
+            values = {}
+            for column, cells in zip(columns, column_values):
+                cell = cells[position] if position < len(cells) and cells[position] else [""]
+                values[column] = cell[0] if column == "items" else numericise(cell[0])
+            if "items" in values:
+                values["items"] = decode_items(values["items"])
+            records.append(InvoiceRecord(values, self, row))
+        return records
+
+    def get_records(self, columns=None, start_row=2, end_row=None):
+        """Read only the given columns for a block of rows, in one request.
+
+        Leaving out "items" skips the bulky JSON column; it is then fetched
+        on first access of record["items"] (see load_items).
+        """
+        headers = self._get_headers()
+        columns = list(columns or [h for h in headers if h != "items"])
+        column_values = self.sheet.batch_get([self._column_range(c, start_row, end_row) for c in columns])
+        length = max((len(values) for values in column_values), default=0)
+        return self._records_from_columns(columns, column_values, range(start_row, start_row + length))
+
+    def get_invoice_numbers(self):
+        values = self.sheet.get(self._column_range("invoice_number", 2))
+        return [int(cells[0]) for cells in values if cells and str(cells[0]).strip().isdigit()]
+
+    def get_invoices_between(self, start_date, end_date, columns=None):
+        """Invoices dated within [start_date, end_date] (YYYY-MM-DD strings).
+
+        Only the date column is scanned; the matching rows are then read in
+        contiguous blocks with a single batch request (see _read_rows).
+        """
+        dates = self.sheet.get(self._column_range("date", 2))
+        rows = [
+            row for row, cells in enumerate(dates, start=2)
+            if cells and str(start_date) <= str(cells[0]).strip() <= str(end_date)
+        ]
+        return self._read_rows(rows, columns)
+
+    def get_invoices_in_range(self, first_number, last_number, columns=None):
+        """Invoices numbered first_number..last_number, located via the row index"""
+        self._refresh_index()
+        rows = sorted(
+            row for number, row in self._row_index.items()
+            if number.isdigit() and int(first_number) <= int(number) <= int(last_number)
         )
-        client = gspread.authorize(creds)
-        self.sheet = client.open(sheet_name).worksheet(worksheet_name)
+        return self._read_rows(rows, columns)
+
+    def get_invoices_by_numbers(self, numbers, columns=None):
+        """Invoices with the given numbers, all read with one batch request"""
+        self._refresh_index()
+        wanted = {str(int(number)) for number in numbers}
+        rows = sorted(row for number, row in self._row_index.items() if number in wanted)
+        return self._read_rows(rows, columns)
+
+    def _read_rows(self, rows, columns=None):
+        """Read the given columns of scattered rows with a single batch request"""
+        if not rows:
+            return []
+        # Collapse rows into runs so each run is one range
+        runs = []
+        for row in rows:
+            if runs and row == runs[-1][1] + 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+
+        headers = self._get_headers()
+        columns = list(columns or [h for h in headers if h != "items"])
+        ranges = [self._column_range(c, first, last) for first, last in runs for c in columns]
+        values = self.sheet.batch_get(ranges)
+        records = []
+        for position, (first, last) in enumerate(runs):
+            run_values = values[position * len(columns):(position + 1) * len(columns)]
+            records.extend(self._records_from_columns(columns, run_values, range(first, last + 1)))
+        return records
+
+    def load_items(self, records):
+        """Fetch and decode the items JSON for records read without it"""
+        missing = [r for r in records if "items" not in r]
+        if not missing:
+            return records
+        values = self.sheet.batch_get([self._column_range("items", r.row, r.row) for r in missing])
+        for record, cells in zip(missing, values):
+            raw = cells[0][0] if cells and cells[0] else ""
+            dict.__setitem__(record, "items", decode_items(raw))
+        return records
+
+    def _max_invoice_number(self):
+        numbers = self.get_invoice_numbers()
+        return max(numbers) if numbers else None
+
+    def _get_counter(self):
+        if self._counter is None:
+            try:
+                worksheet = self.spreadsheet.worksheet(self.counter_worksheet_name)
+            except gspread.exceptions.WorksheetNotFound:
+                worksheet = self.spreadsheet.add_worksheet(self.counter_worksheet_name, rows=1, cols=2)
+                worksheet.update_acell("A1", "last_invoice_number")
+            self._counter = InvoiceCounter(worksheet, cell="B1", seed=self._max_invoice_number)
+        return self._counter
 
     def get_next_invoice_number(self):
-        records = self.sheet.get_all_records()
-        if not records:
-            return 1050
-        return max([int(r["invoice_number"]) for r in records if str(r["invoice_number"]).isdigit()]) + 1
+        """Peek at the next invoice number (cached, safe to call on every rerun)"""
+        return self._get_counter().peek()
+
+    def claim_next_invoice_number(self):
+        """Reserve the invoice number for an invoice that is about to be saved"""
+        return self._get_counter().claim()
 
     def save_invoice(self, invoice_data):
-        # Flatten items for storage, or store as JSON string
-        invoice_data = invoice_data.copy()
-        invoice_data["items"] = json.dumps(invoice_data["items"])
-        # Ensure the order matches the sheet headers
-        headers = self.sheet.row_values(1)
-        row = [invoice_data.get(h, "") for h in headers]
-        self.sheet.append_row(row)
+        self.save_invoices([invoice_data])
+
+    def save_invoices(self, invoices):
+        """Append several invoices with a single API call"""
+        headers = self._get_headers()
+        rows = []
+        for invoice_data in invoices:
+            # Flatten items for storage, or store as JSON string
+            invoice_data = invoice_data.copy()
+            invoice_data["items"] = json.dumps(invoice_data["items"])
+            # Ensure the order matches the sheet headers
+            rows.append([invoice_data.get(h, "") for h in headers])
+        if not rows:
+            return
+        response = self.sheet.append_rows(rows)
+        self._index_appended_rows(response, [invoice.get("invoice_number") for invoice in invoices])
+        self._notify_saved(invoices)
 
     def get_invoice_by_number(self, invoice_number):
-        records = self.sheet.get_all_records()
-        for record in records:
-            if str(record.get("invoice_number")) == str(invoice_number):
-                # Parse items if stored as JSON
-                if "items" in record:
-                    items = record["items"]
-                    if isinstance(items, str):
-                        try:
-                            record["items"] = json.loads(items)
-                        except Exception:
-                            pass
-                return record
-        return None 
-
-data_manager = GoogleSheetsDataManager(sheet_name="invoices")
+        key = str(invoice_number).strip()
+        if self._row_index is None:
+            self._refresh_index()
+        row = self._row_index.get(key)
+        if row is None:
+            # Rows may have been appended by another session since the last refresh
+            self._refresh_index()
+            row = self._row_index.get(key)
+        if row is None:
+            return None
+        record = self._read_row(row)
+        if str(record.get("invoice_number")) != key:
+            # Rows were inserted or deleted by hand; the index is stale
+            self._refresh_index(rebuild=True)
+            row = self._row_index.get(key)
+            if row is None:
+                return None
+            record = self._read_row(row)
+        # Parse items if stored as JSON
+        if "items" in record:
+            record["items"] = decode_items(record["items"])
+        return record
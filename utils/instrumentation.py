@@ -0,0 +1,191 @@
+"""In-process timing histograms for the invoice flow.
+
+    with span("pdf.render"):
+        ...
+
+    @timed("fragment.line_items")
+    def line_items_editor(): ...
+
+Durations are collected per span name (plus optional labels) into
+histograms with Prometheus-style buckets and a window of recent samples
+for percentiles. export_prometheus() renders them in the Prometheus text
+format; export_records() returns one plain dict per histogram, which
+log_summary() writes to the log as JSON lines.
+
+INSTRUMENTATION=false turns it all off: span() returns a shared no-op
+context manager, timed() returns the function unchanged and the store
+is not wrapped in InstrumentedStore (see create_data_manager), so the disabled cost is one
+function call per span.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; +Inf is implied
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_SAMPLES = 512
+METRIC_NAME = "invoice_app_span_seconds"
+
+# Read from the environment only: this module is imported by render workers
+# and CLI tools that have no Streamlit secrets
+_enabled = os.environ.get("INSTRUMENTATION", "true").lower() != "false"
+_NOOP = nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+class Histogram:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.bucket_counts = [0] * (len(BUCKETS) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+            self.errors = 0
+            self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds, error=False):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            if error:
+                self.errors += 1
+            self.recent.append(seconds)
+
+    def percentile(self, fraction):
+        """Percentile over the recent samples"""
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}    # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+
+    def histogram(self, name, labels=()):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def items(self):
+        with self._lock:
+            return sorted(self.histograms.items())
+
+    def reset(self):
+        """Zero every histogram in place; timed() holds on to the ones it was given"""
+        for _, histogram in self.items():
+            histogram.reset()
+
+
+registry = Registry()
+
+
+class _Span:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # st.rerun()/st.stop() raise BaseException subclasses; those are not errors
+        error = exc_type is not None and issubclass(exc_type, Exception)
+        self.histogram.observe(time.perf_counter() - self.start, error=error)
+        return False
+
+
+def span(name, **labels):
+    """Context manager timing one operation into the named histogram"""
+    if not _enabled:
+        return _NOOP
+    return _Span(registry.histogram(name, tuple(sorted(labels.items()))))
+
+
+def timed(name, **labels):
+    """Decorator form of span(); leaves the function untouched when disabled"""
+    def decorate(fn):
+        if not _enabled:
+            return fn
+        histogram = registry.histogram(name, tuple(sorted(labels.items())))
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(histogram):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + sorted(extra.items())
+    return ",".join(f'{key}="{str(value)}"' for key, value in pairs)
+
+
+def export_prometheus():
+    """All histograms in the Prometheus text exposition format"""
+    lines = [
+        f"# HELP {METRIC_NAME} Duration of instrumented operations in the invoice app.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    for (name, labels), histogram in registry.items():
+        with histogram._lock:
+            counts, count, total = list(histogram.bucket_counts), histogram.count, histogram.total
+        span_labels = (("span", name),) + labels
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += bucket_count
+            lines.append(f"{METRIC_NAME}_bucket{{{_labels(span_labels, le=bound)}}} {cumulative}")
+        lines.append(f"{METRIC_NAME}_sum{{{_labels(span_labels)}}} {total:.6f}")
+        lines.append(f"{METRIC_NAME}_count{{{_labels(span_labels)}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def export_records():
+    """One dict per histogram: span, labels, count, errors, mean/p50/p95/max in milliseconds"""
+    records = []
+    for (name, labels), histogram in registry.items():
+        if not histogram.count:
+            continue
+        records.append({
+            "span": name,
+            "labels": dict(labels),
+            "count": histogram.count,
+            "errors": histogram.errors,
+            "mean_ms": round(histogram.total / histogram.count * 1000, 3),
+            "p50_ms": round(histogram.percentile(0.5) * 1000, 3),
+            "p95_ms": round(histogram.percentile(0.95) * 1000, 3),
+            "max_ms": round(histogram.max * 1000, 3),
+        })
+    return records
+
+
+def log_summary():
+    """Write every histogram to the log as one JSON line each"""
+    for record in export_records():
+        logger.info(json.dumps(record))
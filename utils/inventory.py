@@ -0,0 +1,261 @@
+"""Stock ledger for catalog products, in pieces.
+
+Every stock movement is one line appended to a JSONL ledger and is never
+rewritten: sales are posted automatically from the line items of saved
+invoices (one movement per line, negative), and receipts or corrections
+are entered by hand. Current balances per SKU live in memory and in a
+snapshot file that records how far into the ledger it has counted, so a
+restart replays only the lines after the snapshot, and reading a
+balance is a dict lookup.
+
+Quantities are pieces, as on invoices; units_per_ctn from the catalog
+converts cartons entered on a receipt into pieces.
+"""
+import atexit
+import json
+import os
+import threading
+from datetime import datetime
+from utils.file_lock import locked
+
+SALE = "sale"
+RECEIPT = "receipt"
+ADJUSTMENT = "adjustment"
+
+
+def _invoice_number(value):
+    try:
+        return int(float(str(value).strip()))
+    except (TypeError, ValueError):
+        return None
+
+
+class StockLedger:
+    """Append-only stock movements with a materialized balance per SKU.
+
+    Other processes may append to the same ledger; their lines are picked
+    up by reading past the last counted byte, as the CSV store does.
+    Products that have never been received or adjusted are untracked:
+    balance() returns None for them, sales of them are not posted, and
+    they are never reported as low.
+
+    Sales are deduplicated per (store, invoice number): store names the
+    invoice store they came from, since numbering restarts in each store.
+    Only the newest posted_window numbers of each store are remembered;
+    everything at or below the store's watermark counts as posted, since
+    invoices are saved, and so posted, in number order.
+    """
+
+    def __init__(self, get_catalog, ledger_path="data/stock_ledger.jsonl", snapshot_every=200, low_stock_cartons=2,
+                 store="", posted_window=1000):
+        self._get_catalog = get_catalog     # callable, so catalog file edits are seen
+        self.ledger_path = ledger_path
+        self.snapshot_path = ledger_path + ".snapshot.json"
+        self.lock_file = ledger_path + ".lock"
+        self.snapshot_every = snapshot_every
+        self.low_stock_cartons = low_stock_cartons
+        self.balances = {}          # sku -> pieces
+        self.store = store
+        self.posted_window = posted_window
+        self.posted_invoices = {}   # store -> invoice numbers above its watermark
+        self.watermarks = {}        # store -> highest invoice number known to be posted, with all below it
+        self._position = 0          # bytes of the ledger counted into balances
+        self._since_snapshot = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(ledger_path) or ".", exist_ok=True)
+        with self._locked():
+            self._load_snapshot()
+            self._catch_up()
+        atexit.register(self.close)
+
+    @property
+    def catalog(self):
+        return self._get_catalog()
+
+    def _locked(self):
+        return locked(self._lock, self.lock_file)
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        with open(self.snapshot_path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        size = os.path.getsize(self.ledger_path) if os.path.exists(self.ledger_path) else 0
+        if snapshot.get("position", 0) > size:
+            return  # the ledger was replaced; replay it from the start
+        self.balances = snapshot.get("balances", {})
+        self.posted_invoices = {store: set(numbers) for store, numbers in snapshot.get("posted_invoices", {}).items()}
+        self.watermarks = snapshot.get("watermarks", {})
+        self._position = snapshot.get("position", 0)
+
+    def _write_snapshot(self):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "position": self._position,
+                "balances": self.balances,
+                "posted_invoices": {store: sorted(numbers) for store, numbers in self.posted_invoices.items()},
+                "watermarks": self.watermarks,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._since_snapshot = 0
+
+    def _apply(self, movement):
+        sku = movement["sku"]
+        self.balances[sku] = self.balances.get(sku, 0) + int(movement["pieces"])
+        if movement.get("invoice_number") is not None:
+            self._mark_posted(movement["store"], movement["invoice_number"])
+        self._since_snapshot += 1
+
+    def _mark_posted(self, store, invoice_number):
+        number = _invoice_number(invoice_number)
+        if number is None or number <= self.watermarks.get(store, 0):
+            return
+        numbers = self.posted_invoices.setdefault(store, set())
+        numbers.add(number)
+        if len(numbers) > 2 * self.posted_window:
+            # Pruned in bulk, so the sort is paid once per posted_window invoices
+            kept = sorted(numbers)[-self.posted_window:]
+            self.watermarks[store] = kept[0] - 1
+            self.posted_invoices[store] = set(kept)
+
+    def _is_posted(self, store, invoice_number):
+        number = _invoice_number(invoice_number)
+        if number is None:
+            return False
+        return number <= self.watermarks.get(store, 0) or number in self.posted_invoices.get(store, ())
+
+    def _catch_up(self):
+        """Count ledger lines appended since the last look (possibly by another process)"""
+        if not os.path.exists(self.ledger_path) or os.path.getsize(self.ledger_path) <= self._position:
+            return
+        with open(self.ledger_path, "rb") as f:
+            f.seek(self._position)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write from a crash; not counted
+                self._position += len(line)
+                if line.strip():
+                    self._apply(json.loads(line))
+        if self._since_snapshot >= self.snapshot_every:
+            self._write_snapshot()
+
+    def _append(self, movements):
+        data = "".join(json.dumps(m) + "\n" for m in movements).encode("utf-8")
+        with open(self.ledger_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        for movement in movements:
+            self._apply(movement)
+        self._position += len(data)
+        if self._since_snapshot >= self.snapshot_every:
+            self._write_snapshot()
+
+    def _movement(self, kind, sku, pieces, invoice_number=None, note=""):
+        movement = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "kind": kind,
+            "sku": sku,
+            "pieces": int(pieces),
+        }
+        if invoice_number is not None:
+            movement["store"] = self.store
+            movement["invoice_number"] = invoice_number
+        if note:
+            movement["note"] = note
+        return movement
+
+    def post_invoices(self, invoices):
+        """Deduct the catalog line items of saved invoices; usable as a save listener.
+
+        Lines for products that are not in the catalog ("Other") or have
+        never been stocked are skipped, so selling them does not start a
+        negative balance. An invoice is only ever posted once per store.
+        """
+        with self._locked():
+            self._catch_up()
+            catalog = self.catalog
+            movements = []
+            for invoice in invoices:
+                number = invoice.get("invoice_number")
+                if self._is_posted(self.store, number):
+                    continue
+                for item in invoice.get("items") or []:
+                    product = catalog.by_name.get(item.get("product_name"))
+                    quantity = int(item.get("quantity") or 0)
+                    if product is not None and quantity and product.sku in self.balances:
+                        movements.append(self._movement(SALE, product.sku, -quantity, invoice_number=number))
+            if movements:
+                self._append(movements)
+
+    def receive(self, sku, cartons=0, pieces=0, note=""):
+        """Record stock received; cartons are converted with the product's units_per_ctn"""
+        product = self.catalog.by_sku[sku]
+        total = int(cartons) * int(product.units_per_ctn) + int(pieces)
+        if total <= 0:
+            raise ValueError("A receipt must add at least one piece")
+        with self._locked():
+            self._catch_up()
+            self._append([self._movement(RECEIPT, sku, total, note=note)])
+        return total
+
+    def adjust(self, sku, pieces, note):
+        """Correct a balance after a stock count (pieces may be negative)"""
+        if sku not in self.catalog.by_sku:
+            raise KeyError(sku)
+        with self._locked():
+            self._catch_up()
+            self._append([self._movement(ADJUSTMENT, sku, pieces, note=note)])
+
+    def refresh(self):
+        """Pick up movements written by other processes"""
+        with self._locked():
+            self._catch_up()
+
+    def balance(self, sku):
+        """Pieces in stock, or None if the product has never been stocked"""
+        return self.balances.get(sku)
+
+    def low_stock_level(self, sku):
+        product = self.catalog.by_sku[sku]
+        return int(product.units_per_ctn) * self.low_stock_cartons
+
+    def check(self, product_name, quantity):
+        """(balance_after, is_low) for selling quantity pieces of a product.
+
+        Returns None for products that are not in the catalog or not stocked.
+        """
+        product = self.catalog.by_name.get(product_name)
+        if product is None:
+            return None
+        balance = self.balances.get(product.sku)
+        if balance is None:
+            return None
+        after = balance - int(quantity or 0)
+        return after, after < self.low_stock_level(product.sku)
+
+    def movements(self, limit=50):
+        """The most recent movements, newest first"""
+        if not os.path.exists(self.ledger_path):
+            return []
+        with open(self.ledger_path, "rb") as f:
+            # Read only the tail; a movement line is well under 512 bytes
+            f.seek(max(0, os.path.getsize(self.ledger_path) - limit * 512))
+            lines = f.read().splitlines()
+        movements = []
+        for line in reversed(lines):
+            try:
+                movements.append(json.loads(line))
+            except ValueError:
+                continue  # partial first line of the tail
+            if len(movements) == limit:
+                break
+        return movements
+
+    def close(self):
+        with self._locked():
+            self._catch_up()
+            self._write_snapshot()
@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class InvoiceCounter:
+    """Hands out invoice numbers from a single counter cell.
+
+    The cell holds the last number that was claimed. Reads for display go
+    through peek(), which is cached; only claim() writes to the cell.
+    """
+
+    def __init__(self, worksheet, cell="B1", seed=None, start=1050, peek_ttl=30):
+        self.worksheet = worksheet
+        self.cell = cell
+        self.seed = seed    # callable returning the highest number already in use
+        self.start = start
+        self.peek_ttl = peek_ttl
+        self._lock = threading.Lock()
+        self._last = None
+        self._read_at = 0.0
+
+    def _read_last(self):
+        value = self.worksheet.acell(self.cell).value
+        if value is not None and str(value).strip().isdigit():
+            return int(value)
+        # First run against an existing sheet: start after the highest stored number
+        last = self.seed() if self.seed else None
+        if last is None:
+            last = self.start - 1
+        self.worksheet.update_acell(self.cell, last)
+        return last
+
+    def peek(self):
+        """Next number that will be claimed, refreshed at most every peek_ttl seconds"""
+        with self._lock:
+            if self._last is None or time.monotonic() - self._read_at > self.peek_ttl:
+                self._last = self._read_last()
+                self._read_at = time.monotonic()
+            return self._last + 1
+
+    def claim(self):
+        """Reserve and return the next invoice number"""
+        # Sheets has no compare-and-set, so claims are serialised per process.
+        # Streamlit serves every session from one process, which makes this
+        # atomic for the app itself.
+        with self._lock:
+            number = self._read_last() + 1
+            self.worksheet.update_acell(self.cell, number)
+            self._last = number
+            self._read_at = time.monotonic()
+            return number
@@ -1,10 +1,189 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, HRFlowable, Spacer
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, HRFlowable, Spacer, PageBreak, KeepTogether
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER
+import copy
+import io
 import json
+from functools import partial
+from utils.instrumentation import span
+
+# Bump whenever the layout changes, so cached PDFs are rendered again
+TEMPLATE_VERSION = 3
+
+PRODUCT_COL_WIDTHS = [0.5*inch, 1.00*inch, 0.93*inch, 0.90*inch, 0.91*inch, 0.95*inch, 0.82*inch, 0.80*inch, 0.80*inch]
+
+# Padding reportlab's Frame keeps on each side of the page's content area
+FRAME_PADDING = 6
+# Bottom margin of multi-page invoices, leaving room for the page footer
+FOOTER_MARGIN = 28
+
+
+class CachedParagraph(Paragraph):
+    """Paragraph that keeps its line breaks when wrapped again at the same width.
+
+    Tables wrap every cell once to size the rows and again to draw them;
+    line breaking is the costliest part of rendering long invoices.
+    """
+
+    def wrap(self, availWidth, availHeight):
+        if getattr(self, "_wrapped_width", None) != availWidth:
+            self._wrapped_size = Paragraph.wrap(self, availWidth, availHeight)
+            self._wrapped_width = availWidth
+        return self._wrapped_size
+
+
+class NumberedCanvas(canvas.Canvas):
+    """Canvas that writes "Page x of y" on every page once the page count is known"""
+
+    def __init__(self, *args, footer_text="", **kwargs):
+        canvas.Canvas.__init__(self, *args, **kwargs)
+        self.footer_text = footer_text
+        self._saved_page_states = []
+
+    def showPage(self):
+        self._saved_page_states.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        page_count = len(self._saved_page_states)
+        for state in self._saved_page_states:
+            self.__dict__.update(state)
+            self.draw_footer(page_count)
+            canvas.Canvas.showPage(self)
+        canvas.Canvas.save(self)
+
+    def draw_footer(self, page_count):
+        self.setFont("Helvetica", 9)
+        self.drawString(42, 12, self.footer_text)
+        self.drawRightString(self._pagesize[0] - 42, 12, f"Page {self._pageNumber} of {page_count}")
+
+
+def _details_table_style(right_padding):
+    return TableStyle([
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (-1, -1), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('LEFTPADDING', (0, 0), (-1, -1), 30),
+        ('RIGHTPADDING', (0, 0), (-1, -1), right_padding),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),  # Reduced padding
+        ('TOPPADDING', (0, 0), (-1, -1), 2),  # Reduced padding
+    ])
+
+
+class InvoiceTemplate:
+    """Styles and flowables that are identical on every invoice.
+
+    Built once per InvoiceGenerator. Flowables are handed out as shallow
+    copies, so the parsed paragraph text is reused while layout state stays
+    per invoice (renders may run on several threads).
+    """
+
+    def __init__(self, generator):
+        # Main border
+        self.main_table_style = TableStyle([
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),  # Reduced padding
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),  # Reduced padding
+            ('LEFTPADDING', (0, 0), (-1, -1), 15),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 20),
+        ])
+
+        self.header_style = ParagraphStyle(
+            name="HeaderStyle",
+            fontName="Helvetica-Bold",
+            fontSize=10,
+            alignment=TA_CENTER,  # Center horizontally
+            textColor=colors.whitesmoke,
+            leading=12
+        )
+
+        # Organization header
+        self.org_name = Paragraph("MZ TRADERS PESHAWAR", generator.org_header_style)
+        self.manager_details = Paragraph("SALE INVOICE", generator.org_header_style)
+
+        # Horizontal separator line
+        self.separator = HRFlowable(
+            width="100%",
+            thickness=1,
+            color=colors.black,
+            spaceBefore=0,
+            spaceAfter=0
+        )
+
+        self.details_table_1_style = _details_table_style(85)
+        self.details_table_2_style = _details_table_style(70)
+        self.details_table_3_style = _details_table_style(70)
+
+        # Product details table
+        self.product_headers = [
+            CachedParagraph('S#', self.header_style),
+            CachedParagraph('Product<br/>Description', self.header_style),
+            CachedParagraph('Units Per<br/>Ctn', self.header_style),
+            CachedParagraph('Quantity', self.header_style),
+            CachedParagraph('Unit<br/>Rate', self.header_style),
+            CachedParagraph('Discount<br/>(%)', self.header_style),
+            CachedParagraph('Discount<br/>Amount', self.header_style),
+            CachedParagraph('Net<br/>Rate', self.header_style),
+            CachedParagraph('Total<br/>Amount', self.header_style)
+        ]
+        self.products_table_style = TableStyle([
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),  # Add border to product table
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ])
+
+        # Page subtotal rows of multi-page invoices
+        self.forward_row_style = [
+            ('SPAN', (0, 0), (-2, 0)),
+            ('ALIGN', (0, 0), (-2, 0), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ]
+
+        # Summary
+        self.summary_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('LEFTPADDING', (0, 0), (-1, -1), 25),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 25),
+        ])
+
+    def header_rows(self):
+        """Organization name, title and separator rows for the main border"""
+        return [[copy.copy(self.org_name)], [copy.copy(self.manager_details)], [copy.copy(self.separator)]]
+
+    def product_header_row(self):
+        return [copy.copy(p) for p in self.product_headers]
+
+    def forward_row(self, label, amount_paisa):
+        """A running total row ("Carried forward" / "Brought forward") spanning the table"""
+        return [label] + [""] * (len(PRODUCT_COL_WIDTHS) - 2) + [f"{amount_paisa / 100:.2f}/-"]
+
+    def forward_row_commands(self, row):
+        """forward_row_style moved to the given table row"""
+        commands = []
+        for command, (sc, _), (ec, _), *values in self.forward_row_style:
+            commands.append((command, (sc, row), (ec, row), *values))
+        return commands
+
 
 class InvoiceGenerator:
     def __init__(self):
@@ -38,51 +217,26 @@ class InvoiceGenerator:
             alignment=1,  # Center alignment
             spaceAfter=0
         )
+        self.template = InvoiceTemplate(self)
 
-    def generate_invoice(self, invoice_data: dict, output_path: str):
-        """Generate PDF invoice with specific layout"""
-        doc = SimpleDocTemplate(
-            output_path,
-            pagesize=A4,
-            rightMargin=36,
-            leftMargin=36,
-            topMargin=10,
-            bottomMargin=10
-        )
-
-        # Build content
-        elements = []
+    def generate_invoice_bytes(self, invoice_data: dict, save_path: str = None) -> bytes:
+        """Render the invoice in memory; optionally also write it to save_path"""
+        buffer = io.BytesIO()
+        with span("pdf.render"):
+            self.generate_invoice(invoice_data, buffer)
+        pdf_bytes = buffer.getvalue()
+        if save_path:
+            with open(save_path, "wb") as f:
+                f.write(pdf_bytes)
+        return pdf_bytes
 
-        # Main border
-        main_table_style = TableStyle([
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),  # Reduced padding
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),  # Reduced padding
-            ('LEFTPADDING', (0, 0), (-1, -1), 15),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 20),
-        ])
-
-        header_style = ParagraphStyle(
-            name="HeaderStyle",
-            fontName="Helvetica-Bold",
-            fontSize=10,
-            alignment=TA_CENTER,  # Center horizontally
-            textColor=colors.whitesmoke,
-            leading=12
-        )
-                     
-        # Organization header
-        org_name = Paragraph("MZ TRADERS PESHAWAR", self.org_header_style)
-        manager_details = Paragraph("SALE INVOICE", self.org_header_style)
+    def generate_invoice(self, invoice_data: dict, output_path):
+        """Generate PDF invoice with specific layout.
 
-        # Horizontal separator line
-        separator = HRFlowable(
-            width="100%",
-            thickness=1,
-            color=colors.black,
-            spaceBefore=0,
-            spaceAfter=0
-        )
+        output_path is a file path or any writable binary file-like object.
+        """
+        template = self.template
+        doc = self._document(output_path)
 
         # Details with invoice number, date, name, and address
         details_data_1 = [[
@@ -90,61 +244,21 @@ class InvoiceGenerator:
             f"Invoice # {invoice_data['invoice_number']}"
         ]]
         details_table_1 = Table(details_data_1, colWidths=[4*inch, 4*inch])
-        details_table_1.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (-1, -1), (-1, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('LEFTPADDING', (0, 0), (-1, -1), 30),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 85),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),  # Reduced padding
-            ('TOPPADDING', (0, 0), (-1, -1), 2),  # Reduced padding
-        ]))
+        details_table_1.setStyle(template.details_table_1_style)
         details_data_2 = [[
             Paragraph(f"<b>Address:</b> {invoice_data['customer_address']}", self.bold_style),
             f"Date : {invoice_data['date']}"
         ]]
         details_table_2 = Table(details_data_2, colWidths=[4*inch, 4*inch])
-        details_table_2.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (-1, -1), (-1, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('LEFTPADDING', (0, 0), (-1, -1), 30),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 70),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),  # Reduced padding
-            ('TOPPADDING', (0, 0), (-1, -1), 2),  # Reduced padding
-        ]))
+        details_table_2.setStyle(template.details_table_2_style)
         details_data_3 = [[
             Paragraph(f"<b>Order Booker:</b> {invoice_data['order_booker_name']}", self.bold_style)
         ]]
         details_table_3 = Table(details_data_3, colWidths=[8*inch])
-        details_table_3.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('LEFTPADDING', (0, 0), (-1, -1), 30),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 70),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),  # Reduced padding
-            ('TOPPADDING', (0, 0), (-1, -1), 2),  # Reduced padding
-        ]))
+        details_table_3.setStyle(template.details_table_3_style)
 
         # Product details table
-        product_headers = [
-            Paragraph('S#', header_style),
-            Paragraph('Product<br/>Description', header_style),
-            Paragraph('Units Per<br/>Ctn', header_style),
-            Paragraph('Quantity', header_style),
-            Paragraph('Unit<br/>Rate', header_style),
-            Paragraph('Discount<br/>(%)', header_style),
-            Paragraph('Discount<br/>Amount', header_style),
-            Paragraph('Net<br/>Rate', header_style),
-            Paragraph('Total<br/>Amount', header_style)
-        ]
-        product_data = [product_headers]
+        product_data = [template.product_header_row()]
 
         # Parse items if they're stored as a JSON string
         items = invoice_data['items']
@@ -152,10 +266,11 @@ class InvoiceGenerator:
             items = json.loads(items)
 
         total_pieces = 0
+        amounts_paisa = []  # summed as integers, so subtotals add up to the net total exactly
         for ind, item in enumerate(items, start=1):
             product_data.append([
                 ind,
-                Paragraph(item['product_name'], self.wrap_style),
+                CachedParagraph(item['product_name'], self.wrap_style),
                 str(item['units_per_coton']),
                 str(item['quantity']),
                 f"{item['unit_rate']:.2f}/-",
@@ -165,26 +280,7 @@ class InvoiceGenerator:
                 f"{item['total_price']:.2f}/-"
             ])
             total_pieces += int(item['quantity'])
-
-        products_table = Table(product_data, colWidths=[0.5*inch, 1.00*inch, 0.93*inch, 0.90*inch, 0.91*inch, 0.95*inch, 0.82*inch, 0.80*inch, 0.80*inch])
-        products_table.setStyle(TableStyle([
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),  # Add border to product table
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            # ('LEFTPADDING', (0, 0), (-1, -1), 15),
-            # ('RIGHTPADDING', (0, 0), (-1, -1), 15),
-            # ('TOPPADDING', (0, 0), (-1, -1), 10),
-            # ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ]))
+            amounts_paisa.append(round(float(item['total_price']) * 100))
 
         # Summary
         summary_data = [
@@ -192,33 +288,104 @@ class InvoiceGenerator:
             [f"Net Total: {invoice_data['total_amount']:.2f}/-"]
         ]
         summary_table = Table(summary_data, colWidths=[8*inch])
-        summary_table.setStyle(TableStyle([
-            # ('BOX', (0, 0), (-1, -1), 0, colors.black),  # Add border to summary table
-            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('LEFTPADDING', (0, 0), (-1, -1), 25),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 25),
-        ]))
+        summary_table.setStyle(template.summary_table_style)
 
         # Wrap header and customer details in the main border
-        main_content = [
-            [org_name],
-            [manager_details],
-            [separator],
+        main_content = template.header_rows() + [
             [details_table_1],
             [details_table_2],
             [details_table_3]
         ]
         main_table = Table(main_content, colWidths=[8*inch])
-        main_table.setStyle(main_table_style)
-        elements.append(main_table)
+        main_table.setStyle(template.main_table_style)
+
+        # Measure every row once, in one pass; the tables built below are
+        # given these heights, so reportlab never measures or splits them again
+        avail_width = doc.width - 2 * FRAME_PADDING
+        measured = Table(product_data + [template.forward_row("Carried forward", 0)], colWidths=PRODUCT_COL_WIDTHS)
+        measured.setStyle(template.products_table_style)
+        measured.wrap(avail_width, float("inf"))
+        row_heights = measured._rowHeights
+        header_height, item_heights, forward_height = row_heights[0], row_heights[1:-1], row_heights[-1]
+        main_height = main_table.wrap(avail_width, doc.height)[1]
+        summary_height = summary_table.wrap(avail_width, doc.height)[1]
+
+        elements = [main_table]
         elements.append(Spacer(1, 12))  # Add vertical space (12 points) between main_table and products_table
-        elements.append(products_table)
+        if main_height + sum(row_heights[:-1]) + summary_height + 24 <= doc.height - 2 * FRAME_PADDING:
+            # Fits on one page: one table, laid out as always
+            products_table = Table(product_data, colWidths=PRODUCT_COL_WIDTHS, rowHeights=row_heights[:-1])
+            products_table.setStyle(template.products_table_style)
+            elements.append(products_table)
+            canvasmaker = canvas.Canvas
+        else:
+            doc = self._document(output_path, bottom_margin=FOOTER_MARGIN)
+            page_height = doc.height - 2 * FRAME_PADDING
+            pages = _paginate(
+                item_heights,
+                first_page=page_height - main_height - 12 - header_height - forward_height,
+                other_pages=page_height - header_height - 2 * forward_height,
+                # The last page has no carried-forward row but must fit the summary
+                last_page_extra=summary_height + 12 - forward_height,
+            )
+            subtotal = 0
+            for page, (start, end) in enumerate(pages):
+                # Pages are drawn one after another, so they can share one header row
+                rows = [product_data[0]]
+                heights = [header_height]
+                commands = []
+                if page:
+                    commands += template.forward_row_commands(len(rows))
+                    rows.append(template.forward_row("Brought forward", subtotal))
+                    heights.append(forward_height)
+                rows += product_data[start + 1:end + 1]
+                heights += item_heights[start:end]
+                subtotal += sum(amounts_paisa[start:end])
+                if end < len(items):
+                    commands += template.forward_row_commands(len(rows))
+                    rows.append(template.forward_row("Carried forward", subtotal))
+                    heights.append(forward_height)
+                page_table = Table(rows, colWidths=PRODUCT_COL_WIDTHS, rowHeights=heights, repeatRows=1)
+                page_table.setStyle(template.products_table_style)
+                page_table.setStyle(TableStyle(commands))
+                elements.append(page_table)
+                if end < len(items):
+                    elements.append(PageBreak())
+            canvasmaker = partial(NumberedCanvas, footer_text=f"Invoice # {invoice_data['invoice_number']}")
+
         elements.append(Spacer(1, 12))  # Add vertical space (12 points) between main_table and products_table
-        elements.append(summary_table)
+        elements.append(KeepTogether(summary_table))
 
         # Generate PDF
-        doc.build(elements)
+        doc.build(elements, canvasmaker=canvasmaker)
+
+    def _document(self, output_path, bottom_margin=10):
+        return SimpleDocTemplate(
+            output_path,
+            pagesize=A4,
+            rightMargin=36,
+            leftMargin=36,
+            topMargin=10,
+            bottomMargin=bottom_margin
+        )
+
+
+def _paginate(heights, first_page, other_pages, last_page_extra=0):
+    """Split rows into (start, end) ranges whose heights fit each page in turn.
+
+    One pass over the rows; a row taller than a whole page gets a page of its own.
+    The last page must also hold last_page_extra (the totals); when it cannot,
+    its final row moves to a page of its own, so the totals never stand alone.
+    """
+    pages = []
+    start, used, capacity = 0, 0, first_page
+    for i, height in enumerate(heights):
+        if used + height > capacity and i > start:
+            pages.append((start, i))
+            start, used, capacity = i, 0, other_pages
+        used += height
+    if used + last_page_extra > capacity and len(heights) - start > 1:
+        pages.append((start, len(heights) - 1))
+        start = len(heights) - 1
+    pages.append((start, len(heights)))
+    return pages
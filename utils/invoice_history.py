@@ -0,0 +1,79 @@
+"""Base for in-memory views over every stored invoice (sales rollups, search).
+
+The full history is read once, by load(). After that, invoices saved in
+this process arrive through the store's save listener (add_invoices), and
+sync() fetches only the invoice numbers the view has not seen, which
+picks up invoices saved by other processes.
+"""
+import logging
+import threading
+import time
+from utils.storage import INVOICE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceHistory:
+    """Loads the invoice history once and keeps it current.
+
+    Subclasses implement add_invoices(invoices), which must skip invoices
+    already counted, and _has_invoice(number). COLUMNS are the invoice
+    columns read from the store.
+    """
+
+    COLUMNS = INVOICE_COLUMNS
+
+    def __init__(self, data_manager, sync_interval=60):
+        self.data_manager = data_manager
+        self.sync_interval = sync_interval
+        self.loaded = False
+        self._synced_at = 0.0
+        self._syncing = False
+        self._lock = threading.RLock()
+
+    def add_invoices(self, invoices):
+        raise NotImplementedError
+
+    def _has_invoice(self, number):
+        raise NotImplementedError
+
+    def load(self):
+        """Read the full history once; later invoices arrive incrementally"""
+        with self._lock:
+            if self.loaded:
+                return
+            self.add_invoices(self.data_manager.get_records(self.COLUMNS))
+            self.loaded = True
+            self._synced_at = time.monotonic()
+
+    def _sync_due(self):
+        return time.monotonic() - self._synced_at >= self.sync_interval
+
+    def sync(self, force=False):
+        """Pick up invoices saved by other processes (at most every sync_interval seconds)"""
+        if not self.loaded:
+            return self.load()
+        if not force and not self._sync_due():
+            return
+        # Store reads happen outside the lock, so queries keep being answered meanwhile;
+        # add_invoices skips anything a save listener delivered in the meantime
+        missing = [n for n in self.data_manager.get_invoice_numbers() if not self._has_invoice(n)]
+        if missing:
+            self.add_invoices(self.data_manager.get_invoices_by_numbers(missing, self.COLUMNS))
+        self._synced_at = time.monotonic()
+
+    def sync_in_background(self):
+        """Start a sync on a worker thread if one is due, for callers on a query path"""
+        with self._lock:
+            if self._syncing or not self._sync_due():
+                return
+            self._syncing = True
+        threading.Thread(target=self._background_sync, name="invoice-history-sync", daemon=True).start()
+
+    def _background_sync(self):
+        try:
+            self.sync()
+        except Exception:
+            logger.exception("Syncing %s failed", type(self).__name__)
+        finally:
+            self._syncing = False
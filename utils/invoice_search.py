@@ -0,0 +1,161 @@
+"""Invoice search by customer, order booker, product and date.
+
+Secondary indexes map every customer name, order booker and product name
+(from the items JSON) to the numbers of the invoices that mention it, and
+every date to the invoices of that day. Names are looked up through
+SearchIndex, so "zubair" or a misspelled "khybr auto" still find their
+invoices. A query intersects the posting lists of its filters, smallest
+first, and builds result rows only for the page asked for, from a short
+summary kept per invoice; the invoice store is not read at query time.
+
+History is read once, on the first search. Invoices saved later arrive
+through the store's save listener. Invoices saved by other processes are
+picked up by a sync that a search starts on a background thread, so no
+search waits for the store; they show up from the next search on.
+"""
+import bisect
+from utils.invoice_history import InvoiceHistory
+from utils.search_index import SearchIndex, normalize
+from utils.storage import decode_items
+
+FIELDS = ("customer", "order_booker", "product")
+
+
+def _number(value):
+    try:
+        return int(float(str(value).strip()))
+    except (TypeError, ValueError):
+        return None
+
+
+def _amount(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class InvoiceSearch(InvoiceHistory):
+    """Secondary indexes over stored invoices, kept up to date incrementally"""
+
+    def __init__(self, data_manager, sync_interval=60):
+        super().__init__(data_manager, sync_interval)
+        self.postings = {field: {} for field in FIELDS}     # field -> normalized name -> [invoice numbers]
+        self._spellings = {field: {} for field in FIELDS}   # field -> name as written -> its postings
+        self.names = {field: SearchIndex() for field in FIELDS}
+        self.by_date = {}       # YYYY-MM-DD -> [invoice numbers]
+        self.dates = []         # sorted dates that have invoices
+        self.numbers = []       # every indexed invoice number, sorted
+        self.invoices = {}      # invoice number -> (date, customer, order booker, total)
+
+    def _post(self, field, name, number):
+        # The same few names repeat on most invoices; normalize each spelling once
+        postings = self._spellings[field].get(name)
+        if postings is None:
+            key = normalize(name)
+            if not key:
+                return
+            postings = self.postings[field].get(key)
+            if postings is None:
+                postings = self.postings[field][key] = []
+                self.names[field].add(key, name)
+            self._spellings[field][name] = postings
+        postings.append(number)
+
+    def add_invoices(self, invoices):
+        """Index invoices not seen before; usable directly as a save listener"""
+        with self._lock:
+            for invoice in invoices:
+                number = _number(invoice.get("invoice_number"))
+                if number is None or number in self.invoices:
+                    continue
+                invoice_date = str(invoice.get("date") or "").strip()[:10]
+                customer = str(invoice.get("customer_name") or "").strip()
+                booker = str(invoice.get("order_booker_name") or "").strip()
+                self.invoices[number] = (invoice_date, customer, booker, _amount(invoice.get("total_amount")))
+                if not self.numbers or number > self.numbers[-1]:
+                    self.numbers.append(number)
+                else:
+                    bisect.insort(self.numbers, number)
+
+                self._post("customer", customer, number)
+                self._post("order_booker", booker, number)
+                items = decode_items(invoice.get("items")) or []
+                if not isinstance(items, list):
+                    items = []
+                products = {str(item.get("product_name") or "").strip() for item in items if isinstance(item, dict)}
+                for product in products:
+                    self._post("product", product, number)
+                if invoice_date:
+                    numbers = self.by_date.get(invoice_date)
+                    if numbers is None:
+                        numbers = self.by_date[invoice_date] = []
+                        bisect.insort(self.dates, invoice_date)
+                    numbers.append(number)
+
+    def _has_invoice(self, number):
+        return _number(number) in self.invoices
+
+    def _matching(self, field, query):
+        """Invoice numbers whose field matches query by word prefix, or fuzzily if nothing does"""
+        numbers = set()
+        for key in self.names[field].search(query, limit=None):
+            numbers.update(self.postings[field][key])
+        return numbers
+
+    def _dated(self, start_date, end_date):
+        first = bisect.bisect_left(self.dates, start_date)
+        last = bisect.bisect_right(self.dates, end_date)
+        return [number for day in self.dates[first:last] for number in self.by_date[day]]
+
+    def search(self, customer="", order_booker="", product="", start_date=None, end_date=None, page=0, page_size=20):
+        """One page of the invoices matching every given filter, newest first.
+
+        Text filters match names by word prefix ("khyber" finds "Khyber Auto
+        Store"); dates are YYYY-MM-DD strings or dates, both ends inclusive.
+        With no filters at all, every invoice matches.
+        """
+        self.load()
+        self.sync_in_background()
+        dated = start_date is not None or end_date is not None
+        start_date = str(start_date) if start_date is not None else ""
+        end_date = str(end_date) if end_date is not None else "9999-12-31"
+        with self._lock:
+            matches = [
+                self._matching(field, query)
+                for field, query in (("customer", customer), ("order_booker", order_booker), ("product", product))
+                if normalize(query or "")
+            ]
+            if matches:
+                matches.sort(key=len)
+                numbers = matches[0].intersection(*matches[1:])
+                if dated:
+                    invoices = self.invoices
+                    numbers = [n for n in numbers if start_date <= invoices[n][0] <= end_date]
+                numbers = sorted(numbers)
+            elif dated:
+                numbers = sorted(self._dated(start_date, end_date))
+            else:
+                numbers = self.numbers
+
+            total = len(numbers)
+            page = max(0, page)
+            # Sorted oldest first; the page is taken from the end
+            end = max(0, total - page * page_size)
+            page_numbers = numbers[max(0, end - page_size):end][::-1]
+            invoices = [
+                {
+                    "invoice_number": number,
+                    "date": self.invoices[number][0],
+                    "customer_name": self.invoices[number][1],
+                    "order_booker_name": self.invoices[number][2],
+                    "total_amount": self.invoices[number][3],
+                }
+                for number in page_numbers
+            ]
+        return {
+            "invoices": invoices,
+            "total": total,
+            "page": page,
+            "pages": (total + page_size - 1) // page_size,
+        }
@@ -0,0 +1,224 @@
+import atexit
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from utils.storage import StoreWrapper, error_status_code, is_rejection
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceWriteQueue(StoreWrapper):
+    """Queues invoice writes and flushes them to the backend in batches.
+
+    Every queued invoice is first appended to a local spool file, so a crash
+    before the flush does not lose it; the spool is replayed on start-up.
+    A background thread flushes when batch_size invoices are waiting or
+    flush_interval seconds have passed, and once more at interpreter exit.
+    The backend must provide save_invoices(list_of_invoices).
+
+    Only a rejection (a 4xx other than 429) is permanent: the batch is
+    halved until the rejected invoice is alone, the rest is saved, and the
+    rejected invoice is moved to a dead-letter file next to the spool and
+    reported by failed_saves(), instead of blocking everything behind it.
+    Every other error leaves the batch queued for the next flush. After a
+    5xx or a dropped connection the append may have been applied anyway,
+    so before that batch is sent again, the invoices the backend already
+    has are dropped from it, as spooled invoices are after a restart.
+    """
+
+    def __init__(self, backend, spool_path="data/invoice_spool.jsonl", batch_size=20, flush_interval=5.0):
+        super().__init__(backend)
+        self.spool_path = spool_path
+        self.dead_letter_path = os.path.splitext(spool_path)[0] + ".failed.jsonl"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopped = False
+
+        os.makedirs(os.path.dirname(spool_path) or ".", exist_ok=True)
+        self._pending.extend(self._load_spool(self.spool_path))
+        # Queued invoices that may already be in the backend: after a crash, all of them
+        self._unconfirmed = list(self._pending)
+        self._failed = self._load_spool(self.dead_letter_path)
+
+        self._worker = threading.Thread(target=self._run, name="invoice-write-queue", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def _load_spool(self, path):
+        if not os.path.exists(path):
+            return []
+        invoices = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    invoices.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    logger.warning("Skipping unreadable line in %s", path)
+        return invoices
+
+    def _rewrite(self, path, entries):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _rewrite_spool(self):
+        self._rewrite(self.spool_path, self._pending)
+
+    def _run(self):
+        with self._lock:
+            while not self._stopped:
+                self._wakeup.wait_for(
+                    lambda: self._stopped or len(self._pending) >= self.batch_size,
+                    timeout=self.flush_interval,
+                )
+                if self._stopped:
+                    break
+                self._lock.release()
+                try:
+                    self.flush()
+                except Exception:
+                    # Rejections are dead-lettered in _save; what gets here is worth retrying
+                    logger.exception("Flushing queued invoices failed; will retry")
+                finally:
+                    self._lock.acquire()
+
+    def _drop_already_saved(self):
+        """Unconfirmed invoices may have been written just before a crash or a failed response"""
+        unconfirmed = {str(invoice.get("invoice_number")).strip() for invoice in self._unconfirmed}
+        stored = {str(number).strip() for number in self.backend.get_invoice_numbers()} & unconfirmed
+        self._unconfirmed = []
+        if stored:
+            logger.warning("Invoices %s were already saved; not sending them again", sorted(stored))
+            with self._lock:
+                self._pending = [
+                    invoice for invoice in self._pending
+                    if str(invoice.get("invoice_number")).strip() not in stored
+                ]
+                self._rewrite_spool()
+
+    def flush(self):
+        """Write every queued invoice to the backend"""
+        with self._flush_lock:
+            if self._unconfirmed:
+                self._drop_already_saved()
+            with self._lock:
+                batch = list(self._pending)
+            if batch:
+                self._save(batch)
+
+    def _save(self, batch):
+        """Save a batch from the front of the queue; raises on anything but a rejection"""
+        try:
+            self.backend.save_invoices(batch)
+        except Exception as e:
+            if not is_rejection(e):
+                if error_status_code(e) != 429:  # throttled requests are never applied
+                    self._unconfirmed = batch
+                raise
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                self._save(batch[:middle])
+                self._save(batch[middle:])
+                return
+            self._dead_letter(batch[0], e)
+        with self._lock:
+            # Only flush() removes entries, and batches are saved in queue order,
+            # so this batch is still at the front
+            self._pending = self._pending[len(batch):]
+            self._rewrite_spool()
+
+    def _dead_letter(self, invoice_data, error):
+        logger.error("Invoice %s was rejected and will not be retried: %s", invoice_data.get("invoice_number"), error)
+        entry = {
+            "invoice_number": invoice_data.get("invoice_number"),
+            "error": str(error),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "invoice": invoice_data,
+        }
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._failed.append(entry)
+
+    def failed_saves(self):
+        """Dead-lettered invoices: [{invoice_number, error, time, invoice}]"""
+        with self._lock:
+            return list(self._failed)
+
+    def _take_failed(self, invoice_number):
+        key = str(invoice_number).strip()
+        with self._lock:
+            for entry in self._failed:
+                if str(entry["invoice_number"]).strip() == key:
+                    self._failed.remove(entry)
+                    self._rewrite(self.dead_letter_path, self._failed)
+                    return entry
+        raise KeyError(invoice_number)
+
+    def retry_failed_save(self, invoice_number):
+        """Queue a dead-lettered invoice again, e.g. once the cause of the rejection is fixed"""
+        invoice_data = self._take_failed(invoice_number)["invoice"]
+        with self._lock:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(invoice_data, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.append(invoice_data)
+            self._wakeup.notify()
+
+    def dismiss_failed_save(self, invoice_number):
+        """Drop a dead-lettered invoice from failed_saves() once it has been dealt with"""
+        self._take_failed(invoice_number)
+
+    def close(self):
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify_all()
+        self._worker.join(timeout=self.flush_interval)
+        self.flush()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def save_invoice(self, invoice_data):
+        self.save_invoices([invoice_data])
+
+    def save_invoices(self, invoices):
+        lines = [json.dumps(invoice_data, default=str) + "\n" for invoice_data in invoices]
+        if not lines:
+            return
+        with self._lock:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.extend(json.loads(line) for line in lines)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+        # Queued counts as saved: the spool survives a crash
+        self._notify_saved(invoices)
+
+    def get_invoice_by_number(self, invoice_number):
+        key = str(invoice_number).strip()
+        with self._lock:
+            for invoice in reversed(self._pending):
+                if str(invoice.get("invoice_number")).strip() == key:
+                    return json.loads(json.dumps(invoice))
+        return self.backend.get_invoice_by_number(invoice_number)
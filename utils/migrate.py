@@ -0,0 +1,61 @@
+"""Import existing invoices from Google Sheets or the CSV store into SQLite.
+
+    python -m utils.migrate --source sheets
+    python -m utils.migrate --source csv --csv-path data/invoices.csv
+"""
+import argparse
+import csv
+from utils.sqlite_data_manager import SQLiteDataManager
+from utils.storage import INVOICE_COLUMNS, decode_items, get_setting
+
+
+def read_sheets_invoices(sheet_name):
+    from utils.google_sheets_data_manager import GoogleSheetsDataManager
+
+    return GoogleSheetsDataManager(sheet_name=sheet_name).get_records(INVOICE_COLUMNS)
+
+
+def read_csv_invoices(csv_path):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def migrate(invoices, db_path, batch_size=1000):
+    """Copy invoices into the SQLite store; re-running it is harmless"""
+    store = SQLiteDataManager(db_path)
+    imported, skipped = 0, 0
+    batch = []
+    for invoice in invoices:
+        if not str(invoice.get("invoice_number", "")).strip().isdigit():
+            skipped += 1
+            continue
+        invoice = dict(invoice)
+        invoice["items"] = decode_items(invoice.get("items") or "[]")
+        batch.append(invoice)
+        if len(batch) >= batch_size:
+            store.save_invoices(batch)
+            imported += len(batch)
+            batch = []
+    store.save_invoices(batch)
+    imported += len(batch)
+    return imported, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["sheets", "csv"], required=True)
+    parser.add_argument("--sheet-name", default=get_setting("GOOGLE_SHEET_NAME", "invoices"))
+    parser.add_argument("--csv-path", default="data/invoices.csv")
+    parser.add_argument("--db", default=get_setting("SQLITE_PATH", "data/invoices.db"))
+    args = parser.parse_args()
+
+    if args.source == "sheets":
+        invoices = read_sheets_invoices(args.sheet_name)
+    else:
+        invoices = read_csv_invoices(args.csv_path)
+    imported, skipped = migrate(invoices, args.db)
+    print(f"Imported {imported} invoices into {args.db} ({skipped} rows without an invoice number skipped)")
+
+
+if __name__ == "__main__":
+    main()
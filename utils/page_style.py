@@ -0,0 +1,31 @@
+import streamlit as st
+
+hide_button="""
+    <style> 
+        header{
+        visibility:hidden;
+        }
+    </style>"""
+
+hide_streamlit_style = """
+    <style>
+        footer {visibility: hidden;}
+    </style>
+"""
+
+
+@st.cache_resource
+def load_page_styles():
+    """Page CSS, read from disk once per process"""
+    with open('styles/custom.css') as f:
+        return hide_button + hide_streamlit_style + f'<style>{f.read()}</style>'
+
+
+def setup_page(page_title, page_icon="📄"):
+    """Page configuration and styles shared by every page of the app"""
+    st.set_page_config(
+        page_title=page_title,
+        page_icon=page_icon,
+        layout="wide"
+    )
+    st.markdown(load_page_styles(), unsafe_allow_html=True)
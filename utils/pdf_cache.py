@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+from utils.cached_data_manager import LRUCache
+from utils.storage import INVOICE_COLUMNS, decode_items
+
+NUMERIC_FIELDS = ("invoice_number", "total_amount")
+
+
+def _canonical(value):
+    """The same number hashes the same whether it came back as 29574 or 29574.0"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return repr(float(value))
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def normalize_invoice(invoice_data):
+    """Only the rendered fields, with items decoded and numbers in one form"""
+    normalized = {}
+    for column in INVOICE_COLUMNS:
+        if column == "items":
+            # Indexing, not get(): records read without items load them here
+            try:
+                value = decode_items(invoice_data["items"])
+            except KeyError:
+                value = None
+        else:
+            value = invoice_data.get(column)
+        if column in NUMERIC_FIELDS:
+            try:
+                value = float(str(value).strip())
+            except ValueError:
+                pass
+        normalized[column] = _canonical(value)
+    return normalized
+
+
+class RenderedPdfCache:
+    """Rendered invoice PDFs keyed by invoice number and content hash.
+
+    Issued invoices do not change, so a re-download with the same data and
+    template version is served from memory (LRU) or, if disk_dir is set,
+    from a size-capped directory, without calling ReportLab.
+    """
+
+    def __init__(self, template_version, max_entries=128, disk_dir=None, disk_max_bytes=200 * 1024 * 1024):
+        self.template_version = str(template_version)
+        self.memory = LRUCache(maxsize=max_entries, ttl=float("inf"))
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key(self, invoice_data):
+        # Normalized, since a store read-back differs in form from what was saved
+        # (Sheets numericises 29574.0 to 29574; items may still be JSON text)
+        payload = json.dumps(normalize_invoice(invoice_data), sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{self.template_version}\n{payload}".encode("utf-8")).hexdigest()
+        number = "".join(c for c in str(invoice_data.get("invoice_number", "")) if c.isalnum())
+        return f"{number}-{digest[:32]}"
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pdf")
+
+    def get(self, key):
+        pdf_bytes = self.memory.get(key)
+        if pdf_bytes is not None or not self.disk_dir:
+            return pdf_bytes
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+            os.utime(path)  # mtime doubles as the disk LRU clock
+        except FileNotFoundError:
+            return None
+        self.memory.put(key, pdf_bytes)
+        return pdf_bytes
+
+    def put(self, key, pdf_bytes):
+        self.memory.put(key, pdf_bytes)
+        if not self.disk_dir:
+            return
+        with self._disk_lock:
+            tmp_path = self._disk_path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, self._disk_path(key))
+            self._enforce_disk_cap()
+
+    def _enforce_disk_cap(self):
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def get_or_render(self, invoice_data, render):
+        """Cached bytes for invoice_data, calling render(invoice_data) on a miss"""
+        key = self.key(invoice_data)
+        pdf_bytes = self.get(key)
+        if pdf_bytes is None:
+            pdf_bytes = render(invoice_data)
+            self.put(key, pdf_bytes)
+        return pdf_bytes
+
+    def stats(self):
+        return self.memory.stats()
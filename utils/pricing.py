@@ -0,0 +1,98 @@
+"""Vectorised line-item pricing in integer paisa.
+
+Amounts are converted to whole paisa (1/100 rupee) once, priced with
+int64 NumPy arithmetic, and converted back to rupees only for display and
+storage, so totals do not drift with float rounding. The same functions
+price one invoice in the UI or thousands of historical invoices at once.
+"""
+from collections import namedtuple
+import numpy as np
+
+PricedLines = namedtuple("PricedLines", [
+    "unit_rate", "quantity", "discount_percent",
+    "discount_amount", "net_rate", "total_price",   # rupees, float64 arrays
+    "total_amount", "total_pieces",                 # invoice totals
+])
+
+
+def _scaled(values, scale, name="amount"):
+    """Rupee amounts or percents as integer hundredths, converted in one NumPy pass.
+
+    A value finer than 1/scale (a 33.333% discount, a rate of 10.005) is
+    rejected with ValueError rather than silently rounded.
+    """
+    scaled = np.asarray(values, dtype=np.float64) * scale
+    rounded = np.rint(scaled)
+    # Allow for binary float error only (0.29 * 100 == 28.999999999999996)
+    inexact = np.abs(scaled - rounded) > 1e-6
+    if inexact.any():
+        value = np.asarray(values, dtype=np.float64)[inexact][0]
+        raise ValueError(f"{name} {value:g} has more than {len(str(scale)) - 1} decimal places")
+    return rounded.astype(np.int64)
+
+
+def to_paisa(values, name="unit rate"):
+    return _scaled(values, 100, name)
+
+
+def _price_paisa(rate_paisa, quantity, discount_bp):
+    # discount = rate * percent / 100, rounded half-up to a whole paisa
+    discount_paisa = (rate_paisa * discount_bp * 2 + 10000) // 20000
+    net_paisa = rate_paisa - discount_paisa
+    return discount_paisa, net_paisa, net_paisa * quantity
+
+
+def price_lines(unit_rates, quantities, discount_percents):
+    """Price every line in one pass; inputs are equal-length sequences"""
+    rate_paisa = to_paisa(unit_rates)
+    quantity = np.asarray(quantities, dtype=np.int64)
+    discount_bp = _scaled(discount_percents, 100, "discount")  # percent in basis points
+    discount_paisa, net_paisa, total_paisa = _price_paisa(rate_paisa, quantity, discount_bp)
+    return PricedLines(
+        unit_rate=rate_paisa / 100,
+        quantity=quantity,
+        discount_percent=discount_bp / 100,
+        discount_amount=discount_paisa / 100,
+        net_rate=net_paisa / 100,
+        total_price=total_paisa / 100,
+        total_amount=int(total_paisa.sum()) / 100,
+        total_pieces=int(quantity.sum()),
+    )
+
+
+def price_frame(df):
+    """Return a copy of a line-item DataFrame with the derived price columns filled in"""
+    priced = price_lines(df["unit_rate"], df["quantity"], df["discount_percent"])
+    df = df.copy()
+    df["discount_amount"] = priced.discount_amount
+    df["net_rate"] = priced.net_rate
+    df["total_price"] = priced.total_price
+    return df
+
+
+def reprice_invoices(invoices, rates=None):
+    """Recompute totals for many invoices in one vectorised pass.
+
+    rates optionally maps product_name -> unit rate, for "what if" runs
+    against a different price list; unlisted products keep their rate.
+    Returns (total_amounts, total_pieces) arrays aligned with invoices.
+    """
+    owner, unit_rates, quantities, discounts = [], [], [], []
+    for position, invoice in enumerate(invoices):
+        for item in invoice["items"]:
+            owner.append(position)
+            rate = item["unit_rate"]
+            if rates is not None:
+                rate = rates.get(item["product_name"], rate)
+            unit_rates.append(rate)
+            quantities.append(item["quantity"])
+            discounts.append(item.get("discount_percent", 0))
+
+    owner = np.asarray(owner, dtype=np.int64)
+    quantity = np.asarray(quantities, dtype=np.int64)
+    _, _, total_paisa = _price_paisa(to_paisa(unit_rates), quantity, _scaled(discounts, 100, "discount"))
+    invoice_paisa = np.zeros(len(invoices), dtype=np.int64)
+    invoice_pieces = np.zeros(len(invoices), dtype=np.int64)
+    np.add.at(invoice_paisa, owner, total_paisa)
+    np.add.at(invoice_pieces, owner, quantity)
+    return invoice_paisa / 100, invoice_pieces
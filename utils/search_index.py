@@ -0,0 +1,88 @@
+import re
+from bisect import bisect_left, insort
+
+
+def normalize(text):
+    return " ".join(re.findall(r"[a-z0-9]+", str(text).lower()))
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """In-memory prefix + fuzzy search over short names.
+
+    Every word of an entry goes into a sorted token list, so a prefix query
+    is a bisect. A query word that prefixes nothing is matched by trigram
+    similarity instead, which tolerates typos. Entries can be added
+    one at a time as new names appear.
+    """
+
+    def __init__(self, fuzzy_cutoff=0.3):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._keys = []            # entry id -> key returned by search()
+        self._names = []           # entry id -> normalized name
+        self._ids = {}             # key -> entry id
+        self._tokens = []          # sorted (token, entry id)
+        self._trigram_tokens = {}  # trigram -> set of tokens
+        self._token_ids = {}       # token -> set of entry ids
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key, text):
+        if key in self._ids:
+            return
+        entry_id = len(self._keys)
+        self._ids[key] = entry_id
+        self._keys.append(key)
+        name = normalize(text)
+        self._names.append(name)
+        for token in set(name.split()):
+            insort(self._tokens, (token, entry_id))
+            if token not in self._token_ids:
+                self._token_ids[token] = set()
+                for trigram in _trigrams(token):
+                    self._trigram_tokens.setdefault(trigram, set()).add(token)
+            self._token_ids[token].add(entry_id)
+
+    def _prefix_ids(self, prefix):
+        ids = set()
+        position = bisect_left(self._tokens, (prefix, -1))
+        while position < len(self._tokens) and self._tokens[position][0].startswith(prefix):
+            ids.add(self._tokens[position][1])
+            position += 1
+        return ids
+
+    def _fuzzy_ids(self, word):
+        grams = _trigrams(word)
+        counts = {}
+        for trigram in grams:
+            for token in self._trigram_tokens.get(trigram, ()):
+                counts[token] = counts.get(token, 0) + 1
+        ids = set()
+        for token, shared in counts.items():
+            if shared / len(grams | _trigrams(token)) >= self.fuzzy_cutoff:
+                ids |= self._token_ids[token]
+        return ids
+
+    def _match(self, words):
+        ids = None
+        for word in words:
+            found = self._prefix_ids(word) or self._fuzzy_ids(word)
+            ids = found if ids is None else ids & found
+            if not ids:
+                return set()
+        return ids
+
+    def search(self, query, limit=20):
+        """Keys whose words match every word of the query, best matches first"""
+        words = normalize(query).split()
+        if not words:
+            return []
+        ids = self._match(words)
+        query_text = " ".join(words)
+        ranked = sorted(ids, key=lambda i: (not self._names[i].startswith(query_text), self._names[i]))
+        return [self._keys[i] for i in ranked[:limit]]
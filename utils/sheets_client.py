@@ -0,0 +1,255 @@
+"""Google Sheets access shared by the whole process, with quota and retry handling.
+
+All worksheets are reached through one authorized gspread client, so its
+HTTP session and connections are reused across sessions and threads.
+Every request first takes a token from a token bucket sized to the
+Sheets per-minute quota. Errors that are worth retrying are retried with
+jittered exponential backoff:
+
+  reads   429, 5xx and dropped connections
+  writes  429 only; after a 5xx or a dropped connection the write may
+          have been applied, and appends are not idempotent
+
+Identical reads that are already in flight are coalesced (single-flight):
+if ten sessions ask for the same range at once, only one request is sent
+and all ten get its result.
+"""
+import copy
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+import gspread
+import requests
+import streamlit as st
+from google.oauth2.service_account import Credentials
+from utils.instrumentation import span
+from utils.storage import error_status_code, get_setting
+
+logger = logging.getLogger(__name__)
+
+# Worksheet methods that only read, and may be coalesced with identical calls.
+# acell is left out: the invoice counter must see the cell as it is now.
+COALESCED_READS = {"get", "batch_get", "row_values", "col_values", "get_all_values", "get_all_records"}
+READS = COALESCED_READS | {"acell", "cell"}
+WRITES = {"append_row", "append_rows", "update", "update_acell", "update_cell", "batch_update"}
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows `rate` requests per `per` seconds, with bursts of up to `capacity`"""
+
+    def __init__(self, rate, per=60.0, capacity=None):
+        self.capacity = capacity or rate
+        self.fill_rate = rate / per
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting for one if the bucket is empty; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.fill_rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.fill_rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """The server said we are over quota; stop bursting until the bucket refills"""
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = time.monotonic()
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            # Callers may modify what they get back, so each follower gets its own copy
+            return copy.deepcopy(call.result())
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class SheetsClient:
+    """Authorized gspread client plus the shared quota, retry and single-flight state"""
+
+    def __init__(self, client=None, requests_per_minute=60, burst=10, max_retries=5,
+                 backoff_base=1.0, backoff_max=32.0):
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.bucket = TokenBucket(requests_per_minute, per=60.0, capacity=burst)
+        self.flights = SingleFlight()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = _authorize()
+            return self._client
+
+    def _should_retry(self, error, write):
+        if isinstance(error, gspread.exceptions.APIError):
+            status = error_status_code(error)
+            if status == 429:
+                return True
+            return not write and status is not None and 500 <= status < 600
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return not write
+        return False
+
+    def call(self, fn, *args, write=False, **kwargs):
+        """Run one API call under the quota, retrying transient failures"""
+        method = getattr(fn, "__name__", "call")
+        attempt = 0
+        while True:
+            with span("sheets.quota_wait"):
+                self.bucket.acquire()
+            try:
+                with span("sheets.request", method=method):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not self._should_retry(e, write):
+                    raise
+                if error_status_code(e) == 429:
+                    self.bucket.drain()
+                # Full jitter: sessions that were throttled together do not retry together
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                delay = max(delay, _retry_after(e) or 0)
+                attempt += 1
+                self.retries += 1
+                logger.warning("Sheets request failed (%s); retry %d in %.1fs", e, attempt, delay)
+                time.sleep(delay)
+
+    def read(self, key, fn, *args, **kwargs):
+        """A retried read, coalesced with identical reads already in flight"""
+        return self.flights.do(key, lambda: self.call(fn, *args, **kwargs))
+
+    def open(self, sheet_name):
+        return SheetsSpreadsheet(self.call(self.client.open, sheet_name), self)
+
+    def wrap(self, spreadsheet):
+        """Route an already opened (or fake) spreadsheet through this client"""
+        if isinstance(spreadsheet, SheetsSpreadsheet):
+            return spreadsheet
+        return SheetsSpreadsheet(spreadsheet, self)
+
+
+class SheetsSpreadsheet:
+    """Spreadsheet whose worksheets go through a SheetsClient"""
+
+    def __init__(self, spreadsheet, client):
+        self._spreadsheet = spreadsheet
+        self._client = client
+
+    def worksheet(self, title):
+        return SheetsWorksheet(self._client.call(self._spreadsheet.worksheet, title), self._client)
+
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        worksheet = self._client.call(self._spreadsheet.add_worksheet, title, rows=rows, cols=cols, write=True, **kwargs)
+        return SheetsWorksheet(worksheet, self._client)
+
+    def __getattr__(self, name):
+        return getattr(self._spreadsheet, name)
+
+
+class SheetsWorksheet:
+    """Worksheet proxy: reads and writes go through the SheetsClient; anything else passes through"""
+
+    def __init__(self, worksheet, client):
+        self._worksheet = worksheet
+        self._client = client
+
+    def _key(self, name, args, kwargs):
+        spreadsheet_id = getattr(getattr(self._worksheet, "spreadsheet", None), "id", None)
+        worksheet_id = getattr(self._worksheet, "id", None) or id(self._worksheet)
+        return (spreadsheet_id, worksheet_id, name, json.dumps([args, kwargs], sort_keys=True, default=str))
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if name in COALESCED_READS:
+            return lambda *args, **kwargs: self._client.read(self._key(name, args, kwargs), attr, *args, **kwargs)
+        if name in READS:
+            return lambda *args, **kwargs: self._client.call(attr, *args, **kwargs)
+        if name in WRITES:
+            return lambda *args, **kwargs: self._client.call(attr, *args, write=True, **kwargs)
+        return attr
+
+
+def _authorize():
+    # Load credentials from Streamlit secrets
+    creds = st.secrets["GOOGLE_SHEETS_CREDS"]
+    if isinstance(creds, str):
+        creds_dict = json.loads(creds)  # Cloud: JSON string
+    else:
+        creds_dict = dict(creds)   # Local: TOML table
+
+    creds = Credentials.from_service_account_info(
+        creds_dict,
+        scopes=[
+            "https://www.googleapis.com/auth/spreadsheets",
+            "https://www.googleapis.com/auth/drive"
+        ]
+    )
+    return gspread.authorize(creds)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_sheets_client():
+    """The SheetsClient shared by every session and thread in the process.
+
+    SHEETS_REQUESTS_PER_MINUTE and SHEETS_BURST size the token bucket;
+    the default matches the Sheets per-user read quota.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SheetsClient(
+                requests_per_minute=int(get_setting("SHEETS_REQUESTS_PER_MINUTE", 60)),
+                burst=int(get_setting("SHEETS_BURST", 10)),
+                max_retries=int(get_setting("SHEETS_MAX_RETRIES", 5)),
+            )
+        return _shared
@@ -0,0 +1,165 @@
+import json
+import os
+import sqlite3
+import threading
+from utils.storage import INVOICE_COLUMNS, InvoiceRecord, InvoiceStore, decode_items
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    invoice_number INTEGER PRIMARY KEY,
+    customer_name TEXT,
+    customer_address TEXT,
+    items TEXT,
+    total_amount REAL,
+    order_booker_name TEXT,
+    date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices (date);
+CREATE INDEX IF NOT EXISTS idx_invoices_customer_name ON invoices (customer_name);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _to_row(invoice_data):
+    """Coerce an invoice dict (from the UI, Sheets or CSV) into a table row"""
+    row = []
+    for column in INVOICE_COLUMNS:
+        value = invoice_data.get(column, "")
+        if column == "items" and not isinstance(value, str):
+            value = json.dumps(value)
+        elif column == "invoice_number":
+            value = int(value)
+        elif column == "total_amount":
+            value = float(value or 0)
+        row.append(value)
+    return row
+
+
+class SQLiteDataManager(InvoiceStore):
+    """Local invoice store; works offline and keeps lookups indexed"""
+
+    def __init__(self, db_path="data/invoices.db", start=1050):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.start = start
+        # One connection shared by Streamlit's script threads, guarded by a lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def _last_claimed(self):
+        row = self._conn.execute("SELECT value FROM counters WHERE name = 'invoice_number'").fetchone()
+        if row is not None:
+            return row["value"]
+        row = self._conn.execute("SELECT MAX(invoice_number) AS n FROM invoices").fetchone()
+        return row["n"] if row["n"] is not None else self.start - 1
+
+    def get_next_invoice_number(self):
+        with self._lock:
+            return self._last_claimed() + 1
+
+    def claim_next_invoice_number(self):
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, so other processes wait
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                number = self._last_claimed() + 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO counters (name, value) VALUES ('invoice_number', ?)", (number,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return number
+
+    def save_invoice(self, invoice_data):
+        self.save_invoices([invoice_data])
+
+    def save_invoices(self, invoices):
+        rows = [_to_row(invoice_data) for invoice_data in invoices]
+        if not rows:
+            return
+        placeholders = ", ".join("?" for _ in INVOICE_COLUMNS)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO invoices ({', '.join(INVOICE_COLUMNS)}) VALUES ({placeholders})",
+                    rows,
+                )
+                # Keep the counter ahead of imported or externally numbered invoices
+                highest = max(row[0] for row in rows)
+                if highest > self._last_claimed():
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO counters (name, value) VALUES ('invoice_number', ?)", (highest,)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._notify_saved(invoices)
+
+    def get_invoice_by_number(self, invoice_number):
+        try:
+            number = int(str(invoice_number).strip())
+        except ValueError:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM invoices WHERE invoice_number = ?", (number,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["items"] = decode_items(record["items"])
+        return record
+
+    def get_invoice_numbers(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT invoice_number FROM invoices ORDER BY invoice_number")]
+
+    def _select(self, columns, where="", params=()):
+        columns = list(columns or [c for c in INVOICE_COLUMNS if c != "items"])
+        unknown = set(columns) - set(INVOICE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM invoices {where} ORDER BY invoice_number", params
+            ).fetchall()
+        records = []
+        for row in rows:
+            values = dict(row)
+            if "items" in values:
+                values["items"] = decode_items(values["items"])
+            records.append(InvoiceRecord(values, self))
+        return records
+
+    def get_records(self, columns=None):
+        return self._select(columns)
+
+    def get_invoices_between(self, start_date, end_date, columns=None):
+        return self._select(columns, "WHERE date BETWEEN ? AND ?", (str(start_date), str(end_date)))
+
+    def get_invoices_in_range(self, first_number, last_number, columns=None):
+        return self._select(columns, "WHERE invoice_number BETWEEN ? AND ?", (int(first_number), int(last_number)))
+
+    def load_items(self, records):
+        missing = [r for r in records if "items" not in r]
+        if not missing:
+            return records
+        numbers = [int(r["invoice_number"]) for r in missing]
+        placeholders = ", ".join("?" for _ in numbers)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT invoice_number, items FROM invoices WHERE invoice_number IN ({placeholders})", numbers
+            ).fetchall()
+        items = {row["invoice_number"]: decode_items(row["items"]) for row in rows}
+        for record, number in zip(missing, numbers):
+            dict.__setitem__(record, "items", items.get(number, []))
+        return records
@@ -0,0 +1,315 @@
+import json
+import logging
+import os
+import streamlit as st
+from utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Columns of an invoice record, in the order they are stored
+INVOICE_COLUMNS = [
+    'invoice_number', 'customer_name', 'customer_address',
+    'items', 'total_amount', 'order_booker_name', 'date'
+]
+
+
+def get_setting(name, default=None):
+    """Read a setting from the environment, falling back to Streamlit secrets"""
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        # No secrets.toml, e.g. when running the CLI tools locally
+        return default
+
+
+def error_status_code(error):
+    """HTTP status of a failed API call (gspread APIError, requests errors), if any"""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(error, "code", None)
+
+
+def is_rejection(error):
+    """True when the backend refused the request itself (a 4xx other than 429).
+
+    Such a request, e.g. an oversized cell, fails the same way every time
+    it is retried. Anything else, including errors with no HTTP status
+    such as a failed token refresh, may succeed later.
+    """
+    status = error_status_code(error)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+def decode_items(items):
+    if isinstance(items, str):
+        try:
+            return json.loads(items)
+        except Exception:
+            pass
+    return items
+
+
+class InvoiceRecord(dict):
+    """Invoice record whose items JSON is fetched and decoded on first access"""
+
+    def __init__(self, values, manager, row=None):
+        super().__init__(values)
+        self.row = row
+        self._manager = manager
+
+    def __missing__(self, key):
+        if key != "items":
+            raise KeyError(key)
+        self._manager.load_items([self])
+        return dict.__getitem__(self, "items")
+
+    def __reduce__(self):
+        # Copies and pickles are plain dicts, detached from the manager
+        return (dict, (dict(self),))
+
+
+class InvoiceStore:
+    """Interface implemented by every invoice storage backend"""
+
+    def get_next_invoice_number(self):
+        """Peek at the next invoice number; cheap enough for every rerun"""
+        raise NotImplementedError
+
+    def claim_next_invoice_number(self):
+        """Reserve the number for an invoice that is about to be saved"""
+        raise NotImplementedError
+
+    def save_invoice(self, invoice_data):
+        raise NotImplementedError
+
+    def save_invoices(self, invoices):
+        for invoice_data in invoices:
+            self.save_invoice(invoice_data)
+
+    def get_invoice_by_number(self, invoice_number):
+        raise NotImplementedError
+
+    def get_invoice_numbers(self):
+        raise NotImplementedError
+
+    def get_records(self, columns=None):
+        """All invoices, limited to the given columns (items is loaded lazily)"""
+        raise NotImplementedError
+
+    def get_invoices_between(self, start_date, end_date, columns=None):
+        """Invoices dated within [start_date, end_date] (YYYY-MM-DD strings)"""
+        raise NotImplementedError
+
+    def get_invoices_in_range(self, first_number, last_number, columns=None):
+        """Invoices numbered first_number..last_number inclusive"""
+        raise NotImplementedError
+
+    def get_invoices_by_numbers(self, numbers, columns=None):
+        """Invoices with the given numbers, read as one range per run of consecutive numbers"""
+        runs = []
+        for number in sorted({int(n) for n in numbers}):
+            if runs and number == runs[-1][1] + 1:
+                runs[-1][1] = number
+            else:
+                runs.append([number, number])
+        return [record for first, last in runs for record in self.get_invoices_in_range(first, last, columns)]
+
+    def load_items(self, records):
+        """Fetch and decode the items of records read without them"""
+        raise NotImplementedError
+
+    def failed_saves(self):
+        """Invoices accepted for saving that the backend permanently rejected"""
+        return []
+
+    def retry_failed_save(self, invoice_number):
+        """Queue a rejected invoice for saving again"""
+        raise KeyError(invoice_number)
+
+    def dismiss_failed_save(self, invoice_number):
+        """Forget a rejected invoice once it has been dealt with by hand"""
+        raise KeyError(invoice_number)
+
+    def add_save_listener(self, listener):
+        """Call listener(invoices) after every save made through this store"""
+        if "_save_listeners" not in self.__dict__:
+            self._save_listeners = []
+        self._save_listeners.append(listener)
+
+    def _notify_saved(self, invoices):
+        # A failing listener (e.g. a report rollup) must not fail the save
+        for listener in getattr(self, "_save_listeners", ()):
+            try:
+                listener(invoices)
+            except Exception:
+                logger.exception("Save listener %r failed", listener)
+
+
+class StoreWrapper(InvoiceStore):
+    """Base for layers that add behaviour on top of another backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_next_invoice_number(self):
+        return self.backend.get_next_invoice_number()
+
+    def claim_next_invoice_number(self):
+        return self.backend.claim_next_invoice_number()
+
+    def save_invoice(self, invoice_data):
+        self.save_invoices([invoice_data])
+
+    def save_invoices(self, invoices):
+        self.backend.save_invoices(invoices)
+        self._notify_saved(invoices)
+
+    def get_invoice_by_number(self, invoice_number):
+        return self.backend.get_invoice_by_number(invoice_number)
+
+    def get_invoice_numbers(self):
+        return self.backend.get_invoice_numbers()
+
+    def get_records(self, columns=None):
+        return self.backend.get_records(columns)
+
+    def get_invoices_between(self, start_date, end_date, columns=None):
+        return self.backend.get_invoices_between(start_date, end_date, columns)
+
+    def get_invoices_in_range(self, first_number, last_number, columns=None):
+        return self.backend.get_invoices_in_range(first_number, last_number, columns)
+
+    def get_invoices_by_numbers(self, numbers, columns=None):
+        return self.backend.get_invoices_by_numbers(numbers, columns)
+
+    def load_items(self, records):
+        return self.backend.load_items(records)
+
+    def failed_saves(self):
+        return self.backend.failed_saves()
+
+    def retry_failed_save(self, invoice_number):
+        return self.backend.retry_failed_save(invoice_number)
+
+    def dismiss_failed_save(self, invoice_number):
+        return self.backend.dismiss_failed_save(invoice_number)
+
+
+class MirroredDataManager(StoreWrapper):
+    """Primary store plus a best-effort copy of every saved invoice.
+
+    Reads and numbering use the primary only; a failing mirror is logged
+    and never fails the save.
+    """
+
+    def __init__(self, backend, mirror):
+        super().__init__(backend)
+        self.mirror = mirror
+
+    def save_invoices(self, invoices):
+        self.backend.save_invoices(invoices)
+        for invoice_data in invoices:
+            try:
+                self.mirror.save_invoice(invoice_data)
+            except Exception:
+                logger.exception("Mirroring invoice %s failed", invoice_data.get("invoice_number"))
+        self._notify_saved(invoices)
+
+
+class InstrumentedStore(StoreWrapper):
+    """Times every call into the storage backend as store.<method>"""
+
+    def _timed(self, method, *args):
+        with instrumentation.span("store." + method):
+            return getattr(self.backend, method)(*args)
+
+    def get_next_invoice_number(self):
+        return self._timed("get_next_invoice_number")
+
+    def claim_next_invoice_number(self):
+        return self._timed("claim_next_invoice_number")
+
+    def save_invoices(self, invoices):
+        self._timed("save_invoices", invoices)
+        self._notify_saved(invoices)
+
+    def get_invoice_by_number(self, invoice_number):
+        return self._timed("get_invoice_by_number", invoice_number)
+
+    def get_invoice_numbers(self):
+        return self._timed("get_invoice_numbers")
+
+    def get_records(self, columns=None):
+        return self._timed("get_records", columns)
+
+    def get_invoices_between(self, start_date, end_date, columns=None):
+        return self._timed("get_invoices_between", start_date, end_date, columns)
+
+    def get_invoices_in_range(self, first_number, last_number, columns=None):
+        return self._timed("get_invoices_in_range", first_number, last_number, columns)
+
+    def get_invoices_by_numbers(self, numbers, columns=None):
+        return self._timed("get_invoices_by_numbers", numbers, columns)
+
+    def load_items(self, records):
+        return self._timed("load_items", records)
+
+    def __getattr__(self, name):
+        # Backend extras such as cache_stats()
+        if name == "backend":
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+
+def create_sheets_data_manager():
+    from utils.google_sheets_data_manager import GoogleSheetsDataManager
+    from utils.invoice_write_queue import InvoiceWriteQueue
+
+    sheet_name = get_setting("GOOGLE_SHEET_NAME", "invoices")
+    return InvoiceWriteQueue(GoogleSheetsDataManager(sheet_name=sheet_name))
+
+
+def store_identity(backend=None):
+    """Names the configured invoice store, e.g. "sqlite:data/invoices.db".
+
+    Invoice numbers are only unique within one store, so anything keyed by
+    invoice number across stores (the stock ledger) keys by this as well.
+    """
+    backend = (backend or get_setting("INVOICE_STORAGE_BACKEND", "sheets")).lower()
+    if backend == "sqlite":
+        return "sqlite:" + os.path.abspath(get_setting("SQLITE_PATH", "data/invoices.db"))
+    if backend == "csv":
+        return "csv:" + os.path.abspath(get_setting("CSV_PATH", "data/invoices.csv"))
+    return f"{backend}:" + get_setting("GOOGLE_SHEET_NAME", "invoices")
+
+
+def create_data_manager(backend=None):
+    """Build the configured backend.
+
+    INVOICE_STORAGE_BACKEND selects "sheets" (default), "sqlite" or "csv".
+    With sqlite, SHEETS_MIRROR=true also copies every invoice to Google
+    Sheets.
+    """
+    from utils.cached_data_manager import CachedDataManager
+
+    backend = (backend or get_setting("INVOICE_STORAGE_BACKEND", "sheets")).lower()
+    if backend == "sheets":
+        store = create_sheets_data_manager()
+    elif backend == "sqlite":
+        from utils.sqlite_data_manager import SQLiteDataManager
+
+        store = SQLiteDataManager(get_setting("SQLITE_PATH", "data/invoices.db"))
+        if str(get_setting("SHEETS_MIRROR", "false")).lower() == "true":
+            store = MirroredDataManager(store, create_sheets_data_manager())
+    elif backend == "csv":
+        from utils.data_manager import DataManager
+
+        store = DataManager(get_setting("CSV_PATH", "data/invoices.csv"))
+    else:
+        raise ValueError(f"Unknown INVOICE_STORAGE_BACKEND: {backend}")
+    store = CachedDataManager(store)
+    if instrumentation.enabled():
+        store = InstrumentedStore(store)
+    return store
+
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class SubmissionJob:
+    """Handle for one submitted invoice: its PDF render and its save run concurrently"""
+
+    def __init__(self, invoice_data, render_future, save_future):
+        self.invoice_data = invoice_data
+        self.render_future = render_future
+        self.save_future = save_future
+
+    @property
+    def invoice_number(self):
+        return self.invoice_data['invoice_number']
+
+    def pdf_ready(self):
+        return self.render_future.done()
+
+    def saved(self):
+        return self.save_future.done()
+
+    def done(self):
+        return self.pdf_ready() and self.saved()
+
+    def wait_pdf(self, timeout=None):
+        """PDF bytes once rendering finishes; re-raises a render error"""
+        return self.render_future.result(timeout=timeout)
+
+    def wait_saved(self, timeout=None):
+        """Block until the save finishes; re-raises a save error"""
+        return self.save_future.result(timeout=timeout)
+
+    def save_error(self):
+        if not self.save_future.done():
+            return None
+        return self.save_future.exception()
+
+    def wait(self, timeout=None):
+        wait([self.render_future, self.save_future], timeout=timeout)
+        return self.done()
+
+
+class SubmissionPipeline:
+    """Runs the backend write and the PDF render of an invoice side by side.
+
+    The save is network-bound and the render CPU-bound, so on worker threads
+    the caller waits roughly max(save, render) instead of their sum.
+    """
+
+    def __init__(self, data_manager, render, max_workers=4):
+        self.data_manager = data_manager
+        self.render = render
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="invoice-submit")
+
+    def submit(self, invoice_data, **render_options):
+        render_future = self.executor.submit(self.render, invoice_data, **render_options)
+        save_future = self.executor.submit(self.data_manager.save_invoice, invoice_data)
+        return SubmissionJob(invoice_data, render_future, save_future)